@@ -3,14 +3,26 @@
 Anthropic Claude Vision API test script - compare against Tesseract OCR.
 """
 
-import base64
-import json
+# Heavy third-party modules (anthropic, PIL, OpenCV, pytesseract) are imported
+# inside the functions that use them, so usage errors exit without loading them
+import asyncio
+import io
 from pathlib import Path
-import pytesseract
-from PIL import Image
-import anthropic
+import orjson
 import os
 import sys
+from tenacity import retry, retry_if_exception, stop_after_attempt
+
+from key_terms import KEY_TERMS, find_key_terms, update_key_terms
+from result_cache import file_sha256, load_cached_result, save_cached_result
+from vision_comparison import report_retry, run_psm_passes, wait_for_retry_after
+
+# Claude downsamples anything with a longer edge than this, so don't upload more
+MAX_IMAGE_EDGE = 1568
+
+CLAUDE_MODEL = "claude-3-sonnet-20240229"
+
+MEDIA_TYPES = {'.png': "image/png", '.jpg': "image/jpeg", '.jpeg': "image/jpeg"}
 
 
 def setup_anthropic():
@@ -23,35 +35,98 @@ def setup_anthropic():
         print("Or: set ANTHROPIC_API_KEY=your-api-key-here  (Windows)")
         return None
     
-    return anthropic.Anthropic(api_key=api_key)
+    import anthropic
+    
+    # Retries are handled by stream_message so the backoff policy lives in one place
+    return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+
 
+def encode_image_for_claude(image_path, image):
+    """Read image bytes for Claude API; the SDK does the base64 encoding.
 
-def encode_image_for_claude(image_path):
-    """Encode image to base64 for Claude API."""
+    Scans larger than Claude's recommended size are downscaled from the already
+    decoded image and re-encoded as JPEG, which cuts upload time and input
+    tokens. Anything smaller is sent as the original file bytes.
+    """
+    from PIL import Image, ImageOps
+    
+    if max(image.size) > MAX_IMAGE_EDGE:
+        # contain() returns a new image, leaving the shared one untouched
+        small = ImageOps.contain(image, (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        small.convert("RGB").save(buffer, "JPEG", quality=85)
+        return buffer.getvalue(), "image/jpeg"
+    
     with open(image_path, "rb") as image_file:
         image_data = image_file.read()
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Determine media type
-        if image_path.lower().endswith('.png'):
-            media_type = "image/png"
-        elif image_path.lower().endswith(('.jpg', '.jpeg')):
-            media_type = "image/jpeg"
-        else:
-            media_type = "image/png"  # default
-            
-        return base64_image, media_type
+    
+    # Determine media type, defaulting to PNG
+    media_type = MEDIA_TYPES.get(Path(image_path).suffix.lower(), "image/png")
+    return image_data, media_type
+
+
+def is_retryable(error):
+    """True for rate limits, connection failures and transient server errors."""
+    import anthropic
+    return isinstance(error, (anthropic.RateLimitError, anthropic.APIConnectionError, anthropic.InternalServerError))
+
+
+@retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_for_retry_after,
+    stop=stop_after_attempt(4),
+    before_sleep=report_retry,
+    reraise=True
+)
+async def stream_message(client, image_data, media_type, prompt):
+    """Stream Claude's response, stopping as soon as every key term has appeared.
 
+    Returns (response_text, stopped_early). Rate limits and transient server
+    errors are retried; the request is rebuilt on each attempt so the image
+    stream starts from the beginning.
+    """
+    chunks = []
+    found, tail = set(), ""
+    
+    async with client.messages.stream(
+        model=CLAUDE_MODEL,
+        max_tokens=1000,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            # File-like input is base64-encoded by the SDK
+                            "data": io.BytesIO(image_data)
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": prompt
+                    }
+                ]
+            }
+        ]
+    ) as stream:
+        async for text in stream.text_stream:
+            chunks.append(text)
+            tail = update_key_terms(found, tail, text)
+            if len(found) == len(KEY_TERMS):
+                return "".join(chunks), True
+    
+    return "".join(chunks), False
 
-def test_claude_vision(client, image_path):
-    """Test Claude Vision on the image."""
+
+async def test_claude_vision(client, image_path, image, image_hash):
+    """Test Claude Vision on the image, reusing a cached response if there is one."""
     print("🤖 ANTHROPIC CLAUDE VISION RESULTS:")
     print("-" * 50)
     
     try:
-        # Encode image
-        base64_image, media_type = encode_image_for_claude(image_path)
-        
         # Create the prompt
         prompt = """Please analyze this image and extract ALL visible text. This appears to be a magazine cover.
 
@@ -70,44 +145,28 @@ Please format your response as a structured list showing:
 
 Be thorough - extract even text that appears on colored backgrounds or in stylized fonts."""
 
-        # Make API call
-        response = client.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=1000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": base64_image
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
-        )
+        cached = load_cached_result(image_hash, CLAUDE_MODEL)
+        if cached:
+            print("💾 Using cached response")
+            response_text, stopped_early = cached['response_text'], cached['stopped_early']
+        else:
+            image_data, media_type = encode_image_for_claude(image_path, image)
+            
+            # Stream the response so we can stop once all key terms have appeared
+            response_text, stopped_early = await stream_message(client, image_data, media_type, prompt)
+            save_cached_result(image_hash, CLAUDE_MODEL, {
+                'response_text': response_text,
+                'stopped_early': stopped_early
+            })
         
-        # Extract response
-        response_text = response.content[0].text
         print("Claude's Analysis:")
         print(response_text)
+        if stopped_early:
+            print("\n⏹️ Stopped streaming early - all key terms found")
         
         # Try to parse key information
-        text_upper = response_text.upper()
-        found_terms = []
-        key_terms = ['PRIVATE', 'EYE', 'ANDREW', 'DENIES', 'BEING', 'CHINESE', 'SPY', '1642']
-        
-        for term in key_terms:
-            if term in text_upper:
-                found_terms.append(term)
+        key_terms = KEY_TERMS
+        found_terms = find_key_terms(response_text)
         
         print(f"\n📋 KEY TERMS DETECTED: {found_terms}")
         print(f"🎯 DETECTION RATE: {len(found_terms)}/{len(key_terms)} ({len(found_terms)/len(key_terms)*100:.1f}%)")
@@ -115,7 +174,8 @@ Be thorough - extract even text that appears on colored backgrounds or in styliz
         return {
             "full_response": response_text,
             "key_terms_found": found_terms,
-            "detection_rate": len(found_terms)/len(key_terms)
+            "detection_rate": len(found_terms)/len(key_terms),
+            "stopped_early": stopped_early
         }
         
     except Exception as e:
@@ -123,36 +183,37 @@ Be thorough - extract even text that appears on colored backgrounds or in styliz
         return None
 
 
-def test_tesseract_comparison(image_path):
-    """Test Tesseract for comparison."""
+def test_tesseract_comparison(image, image_hash):
+    """Test Tesseract for comparison, reusing the image already opened by main."""
     print("\n🔧 TESSERACT COMPARISON:")
     print("-" * 50)
     
     try:
-        image = Image.open(image_path)
-        
+        # PSM 7/8 treat the whole cover as one line/word and add nothing;
+        # a uniform block pass picks up the headline text sparse mode misses
         configs = [
-            ("PSM 11 Sparse", "--psm 11 --oem 3"),
-            ("PSM 7 Single Line", "--psm 7 --oem 3"),
-            ("PSM 8 Single Word", "--psm 8 --oem 3"),
+            ("PSM 11 Sparse", 11),
+            ("PSM 6 Block", 6),
         ]
         
-        all_text_combined = ""
+        text_parts = []
         
-        for name, config in configs:
-            try:
-                text = pytesseract.image_to_string(image, config=config).strip()
-                all_text_combined += " " + text
-                if text:
-                    print(f"{name}: {repr(text[:60])}...")
-                else:
-                    print(f"{name}: No text extracted")
-            except Exception as e:
-                print(f"{name}: Error - {e}")
+        for name, text, error in run_psm_passes(image, image_hash, configs):
+            if error:
+                print(f"{name}: Error - {error}")
+                continue
+            
+            text_parts.append(text)
+            if text:
+                print(f"{name}: {repr(text[:60])}...")
+            else:
+                print(f"{name}: No text extracted")
+        
+        all_text_combined = " ".join(text_parts)
         
         # Check key terms
-        key_terms = ['PRIVATE', 'EYE', 'ANDREW', 'DENIES', 'BEING', 'CHINESE', 'SPY', '1642']
-        found_terms = [term for term in key_terms if term in all_text_combined.upper()]
+        key_terms = KEY_TERMS
+        found_terms = find_key_terms(all_text_combined)
         
         print(f"\n📋 TESSERACT KEY TERMS: {found_terms}")
         print(f"🎯 TESSERACT RATE: {len(found_terms)}/{len(key_terms)} ({len(found_terms)/len(key_terms)*100:.1f}%)")
@@ -199,7 +260,7 @@ def compare_results(claude_result, tesseract_result):
         print(f"   • For controls testing: Hybrid approach recommended")
 
 
-def main():
+async def main():
     # Get image path
     if len(sys.argv) > 1:
         image_path = sys.argv[1]
@@ -215,18 +276,28 @@ def main():
         return
     
     print(f"Testing Claude Vision vs Tesseract on: {Path(image_path).name}")
-    print(f"Image size: {Image.open(image_path).size}")
     
-    # Setup Anthropic
+    # Set up the client first, so missing credentials stop us before any image work
     client = setup_anthropic()
     if not client:
         return
     
-    # Test Claude Vision
-    claude_result = test_claude_vision(client, image_path)
+    from PIL import Image
+    
+    # Decode once up front; the Claude and Tesseract paths share this image
+    image = Image.open(image_path)
+    image.load()
+    print(f"Image size: {image.size}")
+    
+    # Results are cached per image content, so re-runs on the same scan are free
+    image_hash = file_sha256(image_path)
     
-    # Test Tesseract for comparison
-    tesseract_result = test_tesseract_comparison(image_path)
+    # Run Claude Vision and Tesseract concurrently - the API call is network
+    # bound, so Tesseract runs in a worker thread while we wait on the response
+    claude_result, tesseract_result = await asyncio.gather(
+        test_claude_vision(client, image_path, image, image_hash),
+        asyncio.to_thread(test_tesseract_comparison, image, image_hash),
+    )
     
     # Compare results
     compare_results(claude_result, tesseract_result)
@@ -239,11 +310,10 @@ def main():
     }
     
     output_file = Path("claude_vs_tesseract_results.json")
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    output_file.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
     
     print(f"\n💾 Results saved to: {output_file}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -4,19 +4,35 @@ AWS Bedrock Claude Vision test script - compare against Tesseract OCR.
 Uses Claude 3 Sonnet/Haiku through AWS Bedrock instead of direct Anthropic API.
 """
 
-import base64
-import json
+# Heavy third-party modules (boto3, PIL, OpenCV, pytesseract) are imported
+# inside the functions that use them, so usage errors exit without loading them
+import asyncio
+import io
 from pathlib import Path
-import pytesseract
-from PIL import Image
-import boto3
+import orjson
 import os
 import sys
-from botocore.exceptions import ClientError, NoCredentialsError
+from tenacity import retry, retry_if_exception, stop_after_attempt
+
+from key_terms import KEY_TERMS, find_key_terms, update_key_terms
+from result_cache import file_sha256, load_cached_result, save_cached_result
+from vision_comparison import report_retry, run_psm_passes, wait_for_retry_after
+
+# Claude downsamples anything with a longer edge than this, so don't upload more
+MAX_IMAGE_EDGE = 1568
+
+# Converse API image format for each file extension
+IMAGE_FORMATS = {'.png': "png", '.jpg': "jpeg", '.jpeg': "jpeg", '.webp': "webp", '.gif': "gif"}
+
+# Bedrock error codes that are worth retrying after a backoff
+RETRYABLE_ERROR_CODES = ('ThrottlingException', 'ServiceUnavailableException', 'ModelNotReadyException')
 
 
 def setup_bedrock():
     """Setup AWS Bedrock client."""
+    import boto3
+    from botocore.exceptions import NoCredentialsError
+    
     try:
         # Try to create bedrock client with default credentials
         bedrock = boto3.client(
@@ -46,37 +62,82 @@ def setup_bedrock():
         return None
 
 
-def encode_image_for_bedrock(image_path):
-    """Encode image to base64 for Bedrock."""
+def encode_image_for_bedrock(image_path, image):
+    """Read raw image bytes for the Bedrock Converse API (no base64 needed).
+
+    Scans larger than Claude's recommended size are downscaled from the already
+    decoded image and re-encoded as JPEG before upload. Anything smaller is
+    sent as the original file bytes.
+    """
+    from PIL import Image, ImageOps
+    
+    if max(image.size) > MAX_IMAGE_EDGE:
+        # contain() returns a new image, leaving the shared one untouched
+        small = ImageOps.contain(image, (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        small.convert("RGB").save(buffer, "JPEG", quality=85)
+        return buffer.getvalue(), "jpeg"
+    
     with open(image_path, "rb") as image_file:
         image_data = image_file.read()
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Determine media type for Claude
-        if image_path.lower().endswith('.png'):
-            media_type = "image/png"
-        elif image_path.lower().endswith(('.jpg', '.jpeg')):
-            media_type = "image/jpeg"
-        elif image_path.lower().endswith('.webp'):
-            media_type = "image/webp"
-        elif image_path.lower().endswith('.gif'):
-            media_type = "image/gif"
-        else:
-            media_type = "image/png"  # default
-            
-        return base64_image, media_type
+    
+    # Determine image format for Claude, defaulting to PNG
+    image_format = IMAGE_FORMATS.get(Path(image_path).suffix.lower(), "png")
+    return image_data, image_format
 
 
-def test_claude_bedrock(bedrock_client, image_path, model_id="anthropic.claude-3-sonnet-20240229-v1:0"):
-    """Test Claude through Bedrock on the image."""
-    print(f"🤖 AWS BEDROCK CLAUDE VISION RESULTS:")
-    print(f"Model: {model_id}")
-    print("-" * 60)
+def is_retryable(error):
+    """True for throttling and other transient Bedrock errors."""
+    from botocore.exceptions import ClientError
+    return isinstance(error, ClientError) and error.response['Error']['Code'] in RETRYABLE_ERROR_CODES
+
+
+@retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_for_retry_after,
+    stop=stop_after_attempt(4),
+    before_sleep=report_retry,
+    reraise=True
+)
+def stream_converse(bedrock_client, file=None, **kwargs):
+    """Stream a Converse response, stopping as soon as every key term has appeared.
+
+    Returns (response_text, usage, stopped_early); usage is only reported at the
+    end of the stream, so it is empty when we stop early. Throttled requests
+    are retried, with a notice printed to file (stdout by default).
+    """
+    response = bedrock_client.converse_stream(**kwargs)
+    stream = response['stream']
+    chunks = []
+    found, tail = set(), ""
+    usage = {}
+    
+    for event in stream:
+        if 'contentBlockDelta' in event:
+            text = event['contentBlockDelta']['delta'].get('text', '')
+            chunks.append(text)
+            tail = update_key_terms(found, tail, text)
+            if len(found) == len(KEY_TERMS):
+                stream.close()
+                return "".join(chunks), usage, True
+        elif 'metadata' in event:
+            usage = event['metadata'].get('usage', {})
+    
+    return "".join(chunks), usage, False
+
+
+def test_claude_bedrock(bedrock_client, image_data, image_format, image_hash, model_id="anthropic.claude-3-sonnet-20240229-v1:0", file=None):
+    """Test Claude through Bedrock on already-loaded image bytes, reusing a cached response if there is one.
+    
+    The report is printed to file (stdout by default).
+    """
+    from botocore.exceptions import ClientError
+    
+    print(f"🤖 AWS BEDROCK CLAUDE VISION RESULTS:", file=file)
+    print(f"Model: {model_id}", file=file)
+    print("-" * 60, file=file)
     
     try:
-        # Encode image
-        base64_image, media_type = encode_image_for_bedrock(image_path)
-        
         # Create the prompt
         prompt = """Please analyze this image and extract ALL visible text. This appears to be a magazine cover.
 
@@ -95,64 +156,65 @@ Please format your response as a structured analysis showing:
 
 Be thorough - extract even text that appears on colored backgrounds or in stylized fonts."""
 
-        # Prepare the request body for Bedrock
-        request_body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 1000,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": base64_image
+        cached = load_cached_result(image_hash, model_id)
+        if cached:
+            print("💾 Using cached response", file=file)
+            response_text, usage, stopped_early = cached['response_text'], cached['usage'], cached['stopped_early']
+        else:
+            # Make the Bedrock API call - Converse takes the raw image bytes and
+            # handles the wire encoding itself, so there is no base64/json.dumps copy.
+            # Streaming lets us stop once all key terms have appeared.
+            response_text, usage, stopped_early = stream_converse(
+                bedrock_client,
+                file=file,
+                modelId=model_id,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "image": {
+                                    "format": image_format,
+                                    "source": {"bytes": image_data}
+                                }
+                            },
+                            {
+                                "text": prompt
                             }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        # Make the Bedrock API call
-        response = bedrock_client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(request_body),
-            contentType="application/json"
-        )
-        
-        # Parse response
-        response_body = json.loads(response['body'].read())
-        response_text = response_body['content'][0]['text']
+                        ]
+                    }
+                ],
+                inferenceConfig={"maxTokens": 1000}
+            )
+            save_cached_result(image_hash, model_id, {
+                'response_text': response_text,
+                'usage': usage,
+                'stopped_early': stopped_early
+            })
         
-        print("Claude's Analysis:")
-        print(response_text)
+        print("Claude's Analysis:", file=file)
+        print(response_text, file=file)
+        if stopped_early:
+            print("\n⏹️ Stopped streaming early - all key terms found", file=file)
         
         # Analyze key terms
-        text_upper = response_text.upper()
-        key_terms = ['PRIVATE', 'EYE', 'ANDREW', 'DENIES', 'BEING', 'CHINESE', 'SPY', '1642']
-        found_terms = [term for term in key_terms if term in text_upper]
+        key_terms = KEY_TERMS
+        found_terms = find_key_terms(response_text)
         
-        print(f"\n📋 KEY TERMS DETECTED: {found_terms}")
-        print(f"🎯 DETECTION RATE: {len(found_terms)}/{len(key_terms)} ({len(found_terms)/len(key_terms)*100:.1f}%)")
+        print(f"\n📋 KEY TERMS DETECTED: {found_terms}", file=file)
+        print(f"🎯 DETECTION RATE: {len(found_terms)}/{len(key_terms)} ({len(found_terms)/len(key_terms)*100:.1f}%)", file=file)
         
         # Check usage/cost info
-        if 'usage' in response_body:
-            usage = response_body['usage']
-            print(f"💰 USAGE: Input tokens: {usage.get('input_tokens', 'N/A')}, Output tokens: {usage.get('output_tokens', 'N/A')}")
+        if usage:
+            print(f"💰 USAGE: Input tokens: {usage.get('inputTokens', 'N/A')}, Output tokens: {usage.get('outputTokens', 'N/A')}", file=file)
         
         return {
             "model_id": model_id,
             "full_response": response_text,
             "key_terms_found": found_terms,
             "detection_rate": len(found_terms)/len(key_terms),
-            "usage": response_body.get('usage', {})
+            "usage": usage,
+            "stopped_early": stopped_early
         }
         
     except ClientError as e:
@@ -160,24 +222,26 @@ Be thorough - extract even text that appears on colored backgrounds or in styliz
         error_message = e.response['Error']['Message']
         
         if error_code == 'AccessDeniedException':
-            print(f"❌ Access denied to model {model_id}")
-            print("You may need to request access to Claude models in AWS Bedrock console")
-            print("Go to: AWS Console > Bedrock > Model Access > Request model access")
+            print(f"❌ Access denied to model {model_id}", file=file)
+            print("You may need to request access to Claude models in AWS Bedrock console", file=file)
+            print("Go to: AWS Console > Bedrock > Model Access > Request model access", file=file)
         elif error_code == 'ValidationException':
-            print(f"❌ Validation error: {error_message}")
-            print("Check if the model ID is correct and available in your region")
+            print(f"❌ Validation error: {error_message}", file=file)
+            print("Check if the model ID is correct and available in your region", file=file)
+        elif error_code in RETRYABLE_ERROR_CODES:
+            print(f"❌ Still throttled by Bedrock after retrying ({error_code}): {error_message}", file=file)
         else:
-            print(f"❌ AWS Bedrock error ({error_code}): {error_message}")
+            print(f"❌ AWS Bedrock error ({error_code}): {error_message}", file=file)
         
         return None
         
     except Exception as e:
-        print(f"❌ Error calling Claude through Bedrock: {e}")
+        print(f"❌ Error calling Claude through Bedrock: {e}", file=file)
         return None
 
 
-def test_multiple_claude_models(bedrock_client, image_path):
-    """Test multiple Claude models available on Bedrock."""
+async def test_multiple_claude_models(bedrock_client, image_path, image, image_hash):
+    """Test multiple Claude models available on Bedrock concurrently."""
     
     # Available Claude models on Bedrock (as of 2024)
     models_to_test = [
@@ -186,54 +250,82 @@ def test_multiple_claude_models(bedrock_client, image_path):
         ("anthropic.claude-3-5-sonnet-20241022-v2:0", "Claude 3.5 Sonnet (Latest)"),
     ]
     
-    results = []
+    # Read the image once; every model gets the same payload
+    image_data, image_format = encode_image_for_bedrock(image_path, image)
+    
+    # boto3 is synchronous, so each call runs in a worker thread; the semaphore
+    # caps how many Bedrock requests are in flight at once
+    semaphore = asyncio.Semaphore(3)
     
-    for model_id, description in models_to_test:
-        print(f"\n{'='*70}")
-        print(f"Testing: {description}")
-        print(f"Model ID: {model_id}")
+    # Each model's report is buffered and printed once they're all done, so the
+    # concurrent runs don't interleave their output
+    async def run_model(model_id, description):
+        output = io.StringIO()
+        print(f"\n{'='*70}", file=output)
+        print(f"Testing: {description}", file=output)
+        print(f"Model ID: {model_id}", file=output)
+        
+        async with semaphore:
+            result = await asyncio.to_thread(
+                test_claude_bedrock, bedrock_client, image_data, image_format, image_hash, model_id, output
+            )
         
-        result = test_claude_bedrock(bedrock_client, image_path, model_id)
         if result:
             result['description'] = description
-            results.append(result)
         else:
-            print(f"❌ Failed to test {description}")
+            print(f"❌ Failed to test {description}", file=output)
+        return output.getvalue(), result
+    
+    outcomes = await asyncio.gather(
+        *(run_model(model_id, description) for model_id, description in models_to_test),
+        return_exceptions=True
+    )
+    
+    results = []
+    for (model_id, description), outcome in zip(models_to_test, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"\n❌ Failed to test {description}: {outcome}")
+            continue
+        output, result = outcome
+        print(output, end="")
+        if result:
+            results.append(result)
     
     return results
 
 
-def test_tesseract_comparison(image_path):
-    """Test Tesseract for comparison."""
+def test_tesseract_comparison(image, image_hash):
+    """Test Tesseract for comparison, reusing the image already opened by main."""
     print(f"\n{'='*70}")
     print("🔧 TESSERACT COMPARISON:")
     print("-" * 60)
     
     try:
-        image = Image.open(image_path)
-        
+        # PSM 7/8 treat the whole cover as one line/word and add nothing;
+        # a uniform block pass picks up the headline text sparse mode misses
         configs = [
-            ("PSM 11 Sparse", "--psm 11 --oem 3"),
-            ("PSM 7 Single Line", "--psm 7 --oem 3"),
-            ("PSM 8 Single Word", "--psm 8 --oem 3"),
+            ("PSM 11 Sparse", 11),
+            ("PSM 6 Block", 6),
         ]
         
-        all_text_combined = ""
+        text_parts = []
         
-        for name, config in configs:
-            try:
-                text = pytesseract.image_to_string(image, config=config).strip()
-                all_text_combined += " " + text
-                if text:
-                    print(f"{name}: {repr(text[:60])}...")
-                else:
-                    print(f"{name}: No text extracted")
-            except Exception as e:
-                print(f"{name}: Error - {e}")
+        for name, text, error in run_psm_passes(image, image_hash, configs):
+            if error:
+                print(f"{name}: Error - {error}")
+                continue
+            
+            text_parts.append(text)
+            if text:
+                print(f"{name}: {repr(text[:60])}...")
+            else:
+                print(f"{name}: No text extracted")
+        
+        all_text_combined = " ".join(text_parts)
         
         # Check key terms
-        key_terms = ['PRIVATE', 'EYE', 'ANDREW', 'DENIES', 'BEING', 'CHINESE', 'SPY', '1642']
-        found_terms = [term for term in key_terms if term in all_text_combined.upper()]
+        key_terms = KEY_TERMS
+        found_terms = find_key_terms(all_text_combined)
         
         print(f"\n📋 TESSERACT KEY TERMS: {found_terms}")
         print(f"🎯 TESSERACT RATE: {len(found_terms)}/{len(key_terms)} ({len(found_terms)/len(key_terms)*100:.1f}%)")
@@ -285,7 +377,7 @@ def compare_all_results(claude_results, tesseract_result):
     print(f"   ⚡ High Volume: Use Tesseract first, Claude as fallback for failures")
 
 
-def main():
+async def main():
     # Get image path
     if len(sys.argv) > 1:
         image_path = sys.argv[1]
@@ -301,18 +393,27 @@ def main():
         return
     
     print(f"Testing AWS Bedrock Claude vs Tesseract on: {Path(image_path).name}")
-    print(f"Image size: {Image.open(image_path).size}")
     
-    # Setup Bedrock
+    # Set up the client first, so missing credentials stop us before any image work
     bedrock_client = setup_bedrock()
     if not bedrock_client:
         return
     
+    from PIL import Image
+    
+    # Decode once up front; the Claude and Tesseract paths share this image
+    image = Image.open(image_path)
+    image.load()
+    print(f"Image size: {image.size}")
+    
+    # Results are cached per image content, so re-runs on the same scan are free
+    image_hash = file_sha256(image_path)
+    
     # Test multiple Claude models
-    claude_results = test_multiple_claude_models(bedrock_client, image_path)
+    claude_results = await test_multiple_claude_models(bedrock_client, image_path, image, image_hash)
     
     # Test Tesseract for comparison
-    tesseract_result = test_tesseract_comparison(image_path)
+    tesseract_result = test_tesseract_comparison(image, image_hash)
     
     # Compare all results
     if claude_results:
@@ -326,11 +427,10 @@ def main():
     }
     
     output_file = Path("bedrock_vs_tesseract_results.json")
-    with open(output_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    output_file.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
     
     print(f"\n💾 Results saved to: {output_file}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
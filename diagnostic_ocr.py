@@ -8,6 +8,30 @@ import sys
 from PIL import Image
 from pathlib import Path
 
+try:
+    # tesserocr keeps the model loaded between configs; optional
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?;:()[]{}\'\\"-_@#$%&*+=/<>| '
+
+# (config, psm, oem, variables) - config is the equivalent pytesseract string.
+# OEM 3 is Tesseract's default, so '--psm 3' and '--psm 3 --oem 3' are the same run
+PREPROCESSING_CONFIGS = [
+    ('--psm 3 --oem 3', 3, 3, {}),  # OPTIMAL: Use LSTM OCR Engine only with auto page segmentation
+    ('--psm 6 --oem 3', 6, 3, {}),  # LSTM with single block
+    ('--psm 3 --oem 1', 3, 1, {}),  # Auto segmentation with LSTM + Legacy
+    ('--psm 6 --oem 1', 6, 1, {}),  # Single block with LSTM + Legacy
+    ('--psm 3', 3, 3, {}),          # Auto segmentation, default OEM
+    ('--psm 6', 6, 3, {}),          # Single block, default OEM
+    ('--psm 3 --oem 3 --dpi 300', 3, 3, {'user_defined_dpi': '300'}),  # Optimal + DPI
+    (f'--psm 3 --oem 3 -c tessedit_char_whitelist={WHITELIST}', 3, 3, {'tessedit_char_whitelist': WHITELIST}),
+]
+
+# Values that undo each variable above, so it doesn't leak into the next config
+VARIABLE_DEFAULTS = {'user_defined_dpi': '0', 'tessedit_char_whitelist': ''}
+
 
 def check_tesseract_info():
     """Check Tesseract version and available languages."""
@@ -69,6 +93,51 @@ def test_simple_ocr(image_path: str):
         print(f"Error in simple OCR test: {e}")
 
 
+def run_config_sweep(image, configs):
+    """Run each config over the image, returning {config: text or exception}.
+
+    With tesserocr, one model per OEM stays loaded and only the page
+    segmentation mode and variables change between configs. Configs that
+    resolve to the same run are only recognised once.
+    """
+    results = {}
+    runs = {}
+    
+    if PyTessBaseAPI is None:
+        for config, psm, oem, variables in configs:
+            key = (psm, oem, tuple(sorted(variables.items())))
+            if key not in runs:
+                try:
+                    runs[key] = pytesseract.image_to_string(image, config=config)
+                except Exception as e:
+                    runs[key] = e
+            results[config] = runs[key]
+        return results
+    
+    for engine_mode in sorted({oem for _, _, oem, _ in configs}):
+        with PyTessBaseAPI(oem=engine_mode) as api:
+            for config, psm, oem, variables in configs:
+                if oem != engine_mode:
+                    continue
+                key = (psm, oem, tuple(sorted(variables.items())))
+                if key not in runs:
+                    try:
+                        # SetImage clears the previous result so this config is re-recognised
+                        api.SetImage(image)
+                        api.SetPageSegMode(psm)
+                        for name, value in variables.items():
+                            api.SetVariable(name, value)
+                        runs[key] = api.GetUTF8Text()
+                    except Exception as e:
+                        runs[key] = e
+                    finally:
+                        for name in variables:
+                            api.SetVariable(name, VARIABLE_DEFAULTS[name])
+                results[config] = runs[key]
+    
+    return results
+
+
 def test_with_preprocessing(image_path: str):
     """Test with minimal preprocessing."""
     print(f"\n=== TESTING WITH PREPROCESSING ===")
@@ -83,27 +152,18 @@ def test_with_preprocessing(image_path: str):
         print(f"Length: {len(text.strip())}")
         print(f"Text preview: {repr(text[:200])}")
         
-        # Try different DPI settings
+        # Try different engine, segmentation and DPI settings
         # Some scans might need DPI specification
-        configs = [
-            '--psm 3 --oem 3',  # OPTIMAL: Use LSTM OCR Engine only with auto page segmentation
-            '--psm 6 --oem 3',  # LSTM with single block
-            '--psm 3 --oem 1',  # Auto segmentation with LSTM + Legacy
-            '--psm 6 --oem 1',  # Single block with LSTM + Legacy
-            '--psm 3',          # Auto segmentation, default OEM
-            '--psm 6',          # Single block, default OEM
-            '--psm 3 --oem 3 --dpi 300',  # Optimal + DPI
-            '--psm 3 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?;:()[]{}\'\\"-_@#$%&*+=/<>| ',
-        ]
+        results = run_config_sweep(gray_img, PREPROCESSING_CONFIGS)
         
-        for config in configs:
-            try:
-                result = pytesseract.image_to_string(gray_img, config=config)
-                print(f"\nConfig '{config}':")
-                print(f"Length: {len(result.strip())}")
-                print(f"Sample: {repr(result[:100])}")
-            except Exception as e:
-                print(f"Config '{config}' failed: {e}")
+        for config, _, _, _ in PREPROCESSING_CONFIGS:
+            result = results[config]
+            if isinstance(result, Exception):
+                print(f"Config '{config}' failed: {result}")
+                continue
+            print(f"\nConfig '{config}':")
+            print(f"Length: {len(result.strip())}")
+            print(f"Sample: {repr(result[:100])}")
                 
     except Exception as e:
         print(f"Error in preprocessing test: {e}")
@@ -4,14 +4,39 @@ Enhanced diagnostic script using HOCR format and visual debugging.
 Based on the working approach with visual rendering and reading order.
 """
 
+import html
 import pytesseract
+import re
 import sys
 import webbrowser
 import subprocess
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
+import cv2
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from bs4 import BeautifulSoup
+
+try:
+    # tesserocr runs Tesseract in-process instead of spawning the binary; optional
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+# Each tesseract process spawns up to 4 OpenMP threads by default; pin it to one
+# so the configurations we run side by side don't oversubscribe the CPU
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Tesseract writes every word as <span class='ocrx_word' ... title='bbox x0 y0 x1 y1; ...'>
+HOCR_WORD_RE = re.compile(rb"<span class='ocrx_word'[^>]*?title='bbox (\d+) (\d+) (\d+) (\d+)[^>]*>(.*?)</span>", re.DOTALL)
+HTML_TAG_RE = re.compile(rb'<[^>]+>')
+
+# OpenCV's Hershey fonts only cover ASCII, so other word labels are drawn with PIL
+LABEL_FONT_SIZE = 12
+try:
+    LABEL_FONT = ImageFont.truetype("arial.ttf", LABEL_FONT_SIZE)
+except OSError:
+    LABEL_FONT = ImageFont.load_default()
 
 
 def check_tesseract_info():
@@ -29,10 +54,29 @@ def check_tesseract_info():
         print(f"Error getting Tesseract info: {e}")
 
 
-def test_hocr_approach(image_path: str, config: str = "--psm 3 --oem 3"):
+def generate_hocr(image, config: str) -> bytes:
+    """Run Tesseract over the image and return its HOCR output."""
+    
+    if PyTessBaseAPI is None:
+        return pytesseract.image_to_pdf_or_hocr(image, config=config, extension='hocr')
+    
+    # Diagnostic configs are '--psm N --oem N' with an optional '--dpi N'
+    tokens = config.split()
+    options = dict(zip(tokens[::2], tokens[1::2]))
+    with PyTessBaseAPI(psm=int(options.get('--psm', 3)), oem=int(options.get('--oem', 3))) as api:
+        if '--dpi' in options:
+            api.SetVariable('user_defined_dpi', options['--dpi'])
+        api.SetImage(image)
+        return api.GetHOCRText(0).encode('utf-8')
+
+
+def test_hocr_approach(image_path: str, config: str = "--psm 3 --oem 3", config_name: str = None):
     """Test OCR using HOCR format with visual debugging."""
     
     image_name = Path(image_path).stem
+    if config_name:
+        # Keep each configuration's files apart so parallel runs don't overwrite each other
+        image_name = f"{image_name}_{config_name.replace(' ', '_')}"
     output_dir = Path("diagnostic_output")
     output_dir.mkdir(exist_ok=True)
     
@@ -44,27 +88,32 @@ def test_hocr_approach(image_path: str, config: str = "--psm 3 --oem 3"):
         print(f"\n=== TESTING HOCR APPROACH ===")
         print(f"Config: {config}")
         
-        # Open the image
-        image = Image.open(image_path)
+        # Open the image once for both the HOCR call and the overlay
+        image = Image.open(image_path).convert('RGB')
         print(f"Image size: {image.size}")
         
         # Generate HOCR output
         print("Generating HOCR...")
-        hocr_output = pytesseract.image_to_pdf_or_hocr(image, config=config, extension='hocr')
+        hocr_output = generate_hocr(image, config)
         
-        # Save HOCR to file
-        with open(hocr_path, 'wb') as f:
-            f.write(hocr_output)
+        # Save HOCR to file in the background; everything below works on the bytes in memory
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            hocr_saved = writer.submit(hocr_path.write_bytes, hocr_output)
+            
+            # Parse HOCR once for both the visual and text passes
+            words = parse_hocr_words(hocr_output)
+            
+            # Create visual debugging image
+            print("Creating visual debugging image...")
+            visual_image = render_hocr_boxes(image, words, visual_path)
+            
+            # Extract text in reading order
+            print("Extracting text in reading order...")
+            extracted_text = extract_text_from_hocr(words, text_path)
+            
+            hocr_saved.result()
         print(f"HOCR saved to: {hocr_path}")
         
-        # Parse HOCR and create visual debugging image
-        print("Creating visual debugging image...")
-        visual_image = render_hocr_boxes(image_path, hocr_path, visual_path)
-        
-        # Extract text in reading order
-        print("Extracting text in reading order...")
-        extracted_text = extract_text_from_hocr(hocr_path, text_path)
-        
         print(f"Text length: {len(extracted_text)} characters")
         print(f"Text preview: {repr(extracted_text[:200])}")
         
@@ -81,46 +130,54 @@ def test_hocr_approach(image_path: str, config: str = "--psm 3 --oem 3"):
         return {'success': False, 'error': str(e)}
 
 
-def render_hocr_boxes(image_path: str, hocr_path: Path, output_path: Path):
+def parse_hocr_words(hocr_bytes: bytes):
+    """Parse HOCR into a list of (x0, y0, x1, y1, text) word tuples."""
+    
+    words = []
+    for match in HOCR_WORD_RE.finditer(hocr_bytes):
+        content = match.group(5)
+        # Tesseract emits plenty of whitespace-only words; drop them before any decoding
+        if content.isspace() or not content:
+            continue
+        # Words can wrap their text in <strong>/<em>, and entities are escaped
+        text = html.unescape(HTML_TAG_RE.sub(b'', content).decode('utf-8')).strip()
+        if text:
+            x0, y0, x1, y1 = map(int, match.group(1, 2, 3, 4))
+            words.append((x0, y0, x1, y1, text))
+    return words
+
+
+def render_hocr_boxes(image: Image.Image, words, output_path: Path):
     """Render bounding boxes on image for visual debugging."""
     
     try:
-        # Open the image
-        image = Image.open(image_path)
-        draw = ImageDraw.Draw(image)
-        
-        # Try to load a font (fallback to default if not available)
-        try:
-            font = ImageFont.truetype("arial.ttf", 12)
-        except:
-            font = ImageFont.load_default()
-        
-        # Parse HOCR file
-        with open(hocr_path, 'r', encoding='utf-8') as f:
-            hocr_content = f.read()
-        
-        soup = BeautifulSoup(hocr_content, 'html.parser')
-        word_count = 0
+        # Copy the image into a BGR array for OpenCV drawing
+        canvas = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
         
         # Draw bounding boxes for each word
-        for span in soup.find_all('span', class_='ocrx_word'):
-            if 'title' in span.attrs:
-                title = span['title']
-                # Extract coordinates from title
-                bbox_part = [part for part in title.split(';') if 'bbox' in part][0]
-                coords = list(map(int, bbox_part.split()[1:5]))
-                text = span.get_text().strip()
-                
-                if text:  # Only draw if there's actual text
-                    # Draw bounding box
-                    draw.rectangle(coords, outline='red', width=2)
-                    # Draw text above the box
-                    draw.text((coords[0], coords[1] - 15), text, fill='blue', font=font)
-                    word_count += 1
+        unicode_labels = []
+        for x0, y0, x1, y1, text in words:
+            # Draw bounding box in red
+            cv2.rectangle(canvas, (x0, y0), (x1, y1), (0, 0, 255), 2)
+            if not text.isascii():
+                unicode_labels.append((x0, y0, text))
+                continue
+            # Draw text above the box in blue; plain 8-connected strokes are
+            # legible at this size and skip the anti-aliasing pass
+            cv2.putText(canvas, text, (x0, y0 - 4), cv2.FONT_HERSHEY_PLAIN,
+                        0.8, (255, 0, 0), 1, cv2.LINE_8)
+        
+        # putText would turn accented and other non-ASCII words into '?'s
+        if unicode_labels:
+            labelled = Image.fromarray(cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB))
+            draw = ImageDraw.Draw(labelled)
+            for x0, y0, text in unicode_labels:
+                draw.text((x0, y0 - 4 - LABEL_FONT_SIZE), text, fill=(0, 0, 255), font=LABEL_FONT)
+            canvas = cv2.cvtColor(np.asarray(labelled), cv2.COLOR_RGB2BGR)
         
         # Save the visual debugging image
-        image.save(output_path)
-        print(f"Visual debugging image saved: {output_path} ({word_count} words)")
+        cv2.imwrite(str(output_path), canvas)
+        print(f"Visual debugging image saved: {output_path} ({len(words)} words)")
         
         return output_path
         
@@ -129,33 +186,19 @@ def render_hocr_boxes(image_path: str, hocr_path: Path, output_path: Path):
         return None
 
 
-def extract_text_from_hocr(hocr_path: Path, text_path: Path):
-    """Extract text from HOCR in proper reading order."""
+def extract_text_from_hocr(words, text_path: Path):
+    """Extract text from parsed HOCR words in proper reading order."""
     
     try:
-        with open(hocr_path, 'r', encoding='utf-8') as f:
-            hocr_content = f.read()
-        
-        soup = BeautifulSoup(hocr_content, 'html.parser')
-        
-        # Extract words with their positions
-        words = []
-        for span in soup.find_all('span', class_='ocrx_word'):
-            if 'title' in span.attrs:
-                title = span['title']
-                bbox_part = [part for part in title.split(';') if 'bbox' in part][0]
-                coords = list(map(int, bbox_part.split()[1:5]))
-                text = span.get_text().strip()
-                
-                if text:
-                    # Store (top, left, text) for sorting
-                    words.append((coords[1], coords[0], text))  # (top, left, text)
-        
-        # Sort by reading order: top to bottom, then left to right
-        words.sort(key=lambda w: (w[0], w[1]))
+        # Sort by reading order: top to bottom, then left to right. Tops on the
+        # same visual line jitter by a pixel or two, so bin them by line height first
+        coords = np.array([word[:4] for word in words], dtype=np.int32).reshape(-1, 4)
+        line_height = np.median(coords[:, 3] - coords[:, 1]) if len(coords) else 1
+        line_ids = coords[:, 1] // max(line_height * 0.7, 1)
+        order = np.lexsort((coords[:, 0], line_ids))
         
         # Extract sorted text
-        extracted_text = ' '.join([word[2] for word in words])
+        extracted_text = ' '.join([words[i][4] for i in order])
         
         # Save to text file
         with open(text_path, 'w', encoding='utf-8') as f:
@@ -169,26 +212,52 @@ def extract_text_from_hocr(hocr_path: Path, text_path: Path):
         return ""
 
 
-def compare_configurations(image_path: str):
-    """Compare different Tesseract configurations using HOCR."""
+def compare_configurations(image_path: str, target_text: str = None):
+    """Compare different Tesseract configurations using HOCR.
     
+    With target_text, configurations run in waves of one per worker and later waves are
+    skipped once one finds every target word.
+    """
+    
+    # Most likely to succeed on typical scans first, so it's likely the one that short-circuits
     configs = [
-        ("Optimal", "--psm 3 --oem 3"),
-        ("Legacy", "--psm 3 --oem 0"),
-        ("Hybrid", "--psm 3 --oem 1"),
         ("Single Block", "--psm 6 --oem 3"),
+        ("Optimal", "--psm 3 --oem 3"),
         ("High DPI", "--psm 3 --oem 3 --dpi 300"),
+        ("Hybrid", "--psm 3 --oem 1"),
+        ("Legacy", "--psm 3 --oem 0"),
     ]
+    target_words = target_text.upper().split() if target_text else []
     
-    results = []
+    for name, config in configs:
+        print(f"Testing: {name} ({config})")
     
+    # Tesseract runs single-threaded per process, so run the configurations side by side.
+    # With a target, go in waves of one config per worker so we can stop between waves;
+    # anything already started is left to finish and kept
+    workers = min(len(configs), os.cpu_count() or 1)
+    wave_size = workers if target_words else len(configs)
+    outcomes = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(configs), wave_size):
+            futures = {executor.submit(test_hocr_approach, image_path, config, name): (name, config)
+                       for name, config in configs[start:start + wave_size]}
+            found_all = None
+            for future in as_completed(futures):
+                result = future.result()
+                outcomes[futures[future]] = result
+                if target_words and result['success'] and found_all is None:
+                    text_upper = result['text'].upper()
+                    if all(word in text_upper for word in target_words):
+                        found_all = futures[future][0]
+            if found_all and start + wave_size < len(configs):
+                print(f"All target words found with {found_all}; skipping remaining configs")
+                break
+    
+    results = []
     for name, config in configs:
-        print(f"\n{'='*50}")
-        print(f"Testing: {name}")
-        print(f"Config: {config}")
-        
-        result = test_hocr_approach(image_path, config)
-        if result['success']:
+        result = outcomes.get((name, config))
+        if result and result['success']:
             results.append({
                 'name': name,
                 'config': config,
@@ -244,10 +313,11 @@ def open_results(results):
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python enhanced_diagnostic.py <image_path>")
+        print("Usage: python enhanced_diagnostic.py <image_path> [target_text]")
         return
     
     image_path = sys.argv[1]
+    target_text = sys.argv[2] if len(sys.argv) > 2 else None
     if not Path(image_path).exists():
         print(f"Image not found: {image_path}")
         return
@@ -256,7 +326,7 @@ def main():
     check_tesseract_info()
     
     # Compare different configurations
-    results = compare_configurations(image_path)
+    results = compare_configurations(image_path, target_text)
     
     # Show summary
     print(f"\n{'='*60}")
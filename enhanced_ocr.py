@@ -5,126 +5,236 @@ Specifically designed to handle challenging text recognition cases.
 """
 
 import json
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 import argparse
 
 import pytesseract
-from PIL import Image, ImageOps, ImageFilter, ImageEnhance
+from PIL import Image, ImageFilter, ImageEnhance
 import cv2
 import numpy as np
 
+try:
+    # tesserocr keeps the model loaded between strategies; optional
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+from result_cache import image_blake2b, load_cached_result, save_cached_result
+
 IMG_EXTS = {".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"}
 
+# Each tesseract process spawns up to 4 OpenMP threads by default; pin it to one
+# so the strategies we run side by side don't oversubscribe the CPU
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 
-def advanced_preprocess(img: Image.Image, strategy: str = "default") -> Image.Image:
-    """Apply advanced preprocessing strategies."""
-    # Convert PIL to OpenCV format
-    img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-    
+# tesserocr APIs aren't safe to share between threads, so each worker gets its own
+tesseract_apis = threading.local()
+
+
+def load_bgr(image_path: Path) -> np.ndarray:
+    """Decode an image straight into the BGR array OpenCV works on."""
+    img_cv = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+    if img_cv is None:
+        # Formats OpenCV can't decode (e.g. GIF on older builds) go through PIL
+        img_cv = cv2.cvtColor(np.asarray(Image.open(image_path).convert('RGB')), cv2.COLOR_RGB2BGR)
+    return img_cv
+
+
+def grayscale(img_cv: np.ndarray) -> Image.Image:
+    """Luminosity grayscale of a BGR image array."""
+    return Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY))
+
+
+def advanced_preprocess(img_cv: np.ndarray, strategy: str = "default") -> Image.Image:
+    """Apply advanced preprocessing strategies to a BGR image array."""
     if strategy == "high_contrast":
         # High contrast + denoising
         img_cv = cv2.convertScaleAbs(img_cv, alpha=1.5, beta=10)
         img_cv = cv2.bilateralFilter(img_cv, 9, 75, 75)
-        
-    elif strategy == "morphology":
+        return Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
+    
+    # The remaining strategies produce a 2-D array, which becomes a mode 'L' image
+    if strategy == "morphology":
         # Morphological operations for text cleanup
         gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
         kernel = np.ones((2,2), np.uint8)
-        img_cv = cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel)
-        img_cv = cv2.cvtColor(img_cv, cv2.COLOR_GRAY2BGR)
+        return Image.fromarray(cv2.morphologyEx(gray, cv2.MORPH_CLOSE, kernel))
         
     elif strategy == "adaptive_threshold":
         # Adaptive thresholding
         gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-        img_cv = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                      cv2.THRESH_BINARY, 11, 2)
-        img_cv = cv2.cvtColor(img_cv, cv2.COLOR_GRAY2BGR)
+        return Image.fromarray(cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                                                     cv2.THRESH_BINARY, 11, 2))
         
     elif strategy == "edge_enhance":
         # Edge enhancement
         gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
         edges = cv2.Canny(gray, 50, 150)
-        img_cv = cv2.addWeighted(gray, 0.8, edges, 0.2, 0)
-        img_cv = cv2.cvtColor(img_cv, cv2.COLOR_GRAY2BGR)
+        return Image.fromarray(cv2.addWeighted(gray, 0.8, edges, 0.2, 0))
     
-    # Convert back to PIL
     return Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
 
 
+def threshold(img_cv: np.ndarray, level: int) -> Image.Image:
+    """Binarize to white above the given gray level and black at or below it."""
+    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
+    # A boolean array becomes a packed 1-bit image, an eighth of the size of an 'L' one
+    return Image.fromarray(gray > level)
+
+
+def get_tesseract_api():
+    """This thread's tesserocr API, created (and its model loaded) on first use."""
+    if not hasattr(tesseract_apis, 'api'):
+        tesseract_apis.api = PyTessBaseAPI()
+    return tesseract_apis.api
+
+
+def ocr_with_config(processed_img: Image.Image, config: str) -> str:
+    """OCR one image with a strategy config, in-process when tesserocr is available."""
+    if PyTessBaseAPI is None:
+        return pytesseract.image_to_string(processed_img, config=config)
+    
+    # One resident model per thread; only the image, PSM and whitelist change between runs.
+    # Strategy configs are '--psm N' with an optional '-c name=value'
+    psm_part, _, variable = config.partition(' -c ')
+    name, _, value = variable.partition('=')
+    api = get_tesseract_api()
+    api.SetImage(processed_img)
+    api.SetPageSegMode(int(psm_part.split()[1]))
+    api.SetVariable('tessedit_char_whitelist', value if name == 'tessedit_char_whitelist' else '')
+    return api.GetUTF8Text()
+
+
+def run_tesseract(pending: Dict) -> Dict:
+    """OCR each {(image_hash, config): image}, returning {(image_hash, config): text or exception}."""
+    # Both pytesseract's subprocess and tesserocr release the GIL, so threads are enough
+    with ThreadPoolExecutor(max_workers=max(1, min(len(pending), os.cpu_count() or 1))) as executor:
+        futures = {run_key: executor.submit(ocr_with_config, processed_img, run_key[1])
+                   for run_key, processed_img in pending.items()}
+    
+    outcomes = {}
+    for run_key, future in futures.items():
+        try:
+            outcomes[run_key] = future.result()
+        except Exception as e:
+            outcomes[run_key] = e
+    return outcomes
+
+
+# Characters the whitelisted strategies restrict Tesseract to
+WHITELIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?;:()[]{}'-_@#$%&*+=/<>| "
+
+# Define multiple OCR strategies once; 'preprocess' takes the BGR source array
+STRATEGIES = (
+    # Strategy 1: Minimal preprocessing with different PSM modes
+    {
+        'name': 'minimal_psm6',
+        'preprocess': grayscale,
+        'config': f'--psm 6 -c tessedit_char_whitelist={WHITELIST}'
+    },
+    {
+        'name': 'minimal_psm8',
+        'preprocess': grayscale,
+        'config': f'--psm 8 -c tessedit_char_whitelist={WHITELIST}'
+    },
+    {
+        'name': 'minimal_psm3',
+        'preprocess': grayscale,
+        'config': f'--psm 3 -c tessedit_char_whitelist={WHITELIST}'
+    },
+    # Strategy 2: High contrast
+    {
+        'name': 'high_contrast',
+        'preprocess': lambda x: advanced_preprocess(x, "high_contrast"),
+        'config': f'--psm 6 -c tessedit_char_whitelist={WHITELIST}'
+    },
+    # Strategy 3: No character whitelist - sometimes helps with special cases
+    {
+        'name': 'no_whitelist_psm6',
+        'preprocess': grayscale,
+        'config': '--psm 6'
+    },
+    {
+        'name': 'no_whitelist_psm3',
+        'preprocess': grayscale,
+        'config': '--psm 3'
+    },
+    # Strategy 4: Traditional preprocessing with different settings
+    {
+        'name': 'traditional_high_thresh',
+        'preprocess': lambda x: threshold(x, 180),
+        'config': f'--psm 6 -c tessedit_char_whitelist={WHITELIST}'
+    },
+    # Strategy 5: Enhanced contrast
+    {
+        'name': 'enhanced_contrast',
+        'preprocess': lambda x: ImageEnhance.Contrast(grayscale(x)).enhance(2.0),
+        'config': '--psm 6'
+    },
+    # Strategy 6: Simple preprocessing variations
+    {
+        'name': 'threshold_150',
+        'preprocess': lambda x: threshold(x, 150),
+        'config': '--psm 6'
+    },
+    {
+        'name': 'threshold_120',
+        'preprocess': lambda x: threshold(x, 120),
+        'config': '--psm 6'
+    }
+)
+
+
 def multi_strategy_ocr(image_path: Path, target_text: Optional[str] = None) -> Dict:
     """Try multiple OCR strategies and return the best result."""
-    img = Image.open(image_path)
-    
-    # Define multiple OCR strategies
-    charset = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?;:()[]{}'-_@#$%&*+=/<>| "
-    
-    strategies = [
-        # Strategy 1: Minimal preprocessing with different PSM modes
-        {
-            'name': 'minimal_psm6',
-            'preprocess': lambda x: ImageOps.grayscale(x),
-            'config': f'--psm 6 -c tessedit_char_whitelist={charset}'
-        },
-        {
-            'name': 'minimal_psm8',
-            'preprocess': lambda x: ImageOps.grayscale(x),
-            'config': f'--psm 8 -c tessedit_char_whitelist={charset}'
-        },
-        {
-            'name': 'minimal_psm3',
-            'preprocess': lambda x: ImageOps.grayscale(x),
-            'config': f'--psm 3 -c tessedit_char_whitelist={charset}'
-        },
-        # Strategy 2: High contrast
-        {
-            'name': 'high_contrast',
-            'preprocess': lambda x: advanced_preprocess(x, "high_contrast"),
-            'config': f'--psm 6 -c tessedit_char_whitelist={charset}'
-        },
-        # Strategy 3: No character whitelist - sometimes helps with special cases
-        {
-            'name': 'no_whitelist_psm6',
-            'preprocess': lambda x: ImageOps.grayscale(x),
-            'config': '--psm 6'
-        },
-        {
-            'name': 'no_whitelist_psm3',
-            'preprocess': lambda x: ImageOps.grayscale(x),
-            'config': '--psm 3'
-        },
-        # Strategy 4: Traditional preprocessing with different settings
-        {
-            'name': 'traditional_high_thresh',
-            'preprocess': lambda x: x.convert('L').point(lambda p: 255 if p > 180 else 0),
-            'config': f'--psm 6 -c tessedit_char_whitelist={charset}'
-        },
-        # Strategy 5: Enhanced contrast
-        {
-            'name': 'enhanced_contrast',
-            'preprocess': lambda x: ImageEnhance.Contrast(ImageOps.grayscale(x)).enhance(2.0),
-            'config': '--psm 6'
-        },
-        # Strategy 6: Simple preprocessing variations
-        {
-            'name': 'threshold_150',
-            'preprocess': lambda x: x.convert('L').point(lambda p: 255 if p > 150 else 0),
-            'config': '--psm 6'
-        },
-        {
-            'name': 'threshold_120',
-            'preprocess': lambda x: x.convert('L').point(lambda p: 255 if p > 120 else 0),
-            'config': '--psm 6'
-        }
-    ]
+    img = load_bgr(image_path)
+    
+    # Preprocessing is cheap, so do it up front and only fan out the OCR.
+    # Strategies sharing a preprocess step (grayscale, mostly) reuse its output.
+    # Every step returns a new image, so they can all read the source array directly
+    jobs = []
+    processed = {}
+    for strategy in STRATEGIES:
+        try:
+            if strategy['preprocess'] not in processed:
+                processed[strategy['preprocess']] = strategy['preprocess'](img)
+            jobs.append((strategy, processed[strategy['preprocess']]))
+        except Exception as e:
+            print(f"Error with strategy {strategy['name']}: {e}", file=sys.stderr)
+    
+    # Strategies that produce the same image with the same config share one tesseract run,
+    # and runs cached by an earlier invocation need none
+    texts = {}
+    pending = {}
+    run_keys = []
+    for strategy, processed_img in jobs:
+        run_key = (image_blake2b(processed_img), strategy['config'])
+        run_keys.append((strategy, run_key))
+        if run_key in texts or run_key in pending:
+            continue
+        entry = load_cached_result(run_key[0], f"tesseract-{run_key[1]}")
+        if entry is not None:
+            texts[run_key] = entry['text']
+        else:
+            pending[run_key] = processed_img
+    
+    outcomes = run_tesseract(pending)
     
     results = []
     
-    for strategy in strategies:
+    for strategy, run_key in run_keys:
         try:
-            processed_img = strategy['preprocess'](img.copy())
-            text = pytesseract.image_to_string(processed_img, config=strategy['config'])
+            if run_key not in texts:
+                if isinstance(outcomes[run_key], Exception):
+                    raise outcomes[run_key]
+                texts[run_key] = outcomes[run_key]
+                save_cached_result(run_key[0], f"tesseract-{run_key[1]}", {'text': texts[run_key]})
+            text = texts[run_key]
             
             # Calculate score based on text length and target match
             score = len(text.strip())
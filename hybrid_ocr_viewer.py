@@ -5,47 +5,74 @@ Supports local-only mode (Tesseract) and AI-enhanced mode (OpenAI/Claude).
 Uses caching and toggleable overlays for interactive text extraction.
 """
 
+import asyncio
 import base64
+import functools
+import io
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import openai
 import os
+import sqlite3
 import sys
+import threading
 from flask import Flask, render_template, request, jsonify, send_from_directory
 import re
 import pytesseract
 from PIL import Image
-from bs4 import BeautifulSoup
+import numpy as np
+from lxml import etree
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
+try:
+    # tesserocr keeps the model loaded between pages; optional
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
 
-app = Flask(__name__)
+from result_cache import file_sha256, load_cached_result, save_cached_result
 
-# Global storage for processed images
-processed_images = {}
+# Each tesseract process spawns up to 4 OpenMP threads by default; pin it to one
+# so the pages we OCR side by side don't oversubscribe the CPU
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 
+# Most OpenAI Vision requests allowed in flight at once
+MAX_CONCURRENT_VISION_REQUESTS = 10
 
-def setup_openai():
-    """Setup OpenAI client with API key."""
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        print("❌ OPENAI_API_KEY environment variable not set")
-        return None
-    return openai.OpenAI(api_key=api_key)
+# Seconds between launching the first wave of Vision requests, so their encoding
+# and uploads don't all land at once
+VISION_LAUNCH_STAGGER = 0.25
 
+VISION_MODEL = "gpt-4o"
 
-def encode_image(image_path):
-    """Encode image to base64 for OpenAI API."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+# Longest single wait between retries of a rate-limited request, in seconds
+MAX_RETRY_WAIT = 32
 
+# Word box and confidence from an ocrx_word title, e.g. 'bbox 36 92 96 116; x_wconf 95'
+HOCR_TITLE_RE = re.compile(r'bbox (\d+) (\d+) (\d+) (\d+).*?x_wconf (\d+)')
 
-def extract_text_with_openai(client, image_path):
-    """Extract text using OpenAI Vision with position estimation (for complex layouts)."""
-    
-    try:
-        base64_image = encode_image(image_path)
-        
-        prompt = """Analyze this image and extract ALL visible text with approximate positions.
+# Parses the JSON array out of a Vision reply in place, wherever it starts
+JSON_DECODER = json.JSONDecoder()
+
+# Quoted strings, for the manual fallback
+QUOTED_TEXT_RE = re.compile(r'"([^"]+)"')
+
+# Characters that make up OCR noise words when nothing else is present
+SYMBOL_CHARS = frozenset('!@#$%^&*()_+-=[]{}|\\:";\'<>?,./')
+
+# GPT-4o scales high-detail images to fit 2048x2048, so don't upload more
+MAX_IMAGE_EDGE = 2048
+
+MEDIA_TYPES = {'.png': "image/png", '.jpg': "image/jpeg", '.jpeg': "image/jpeg"}
+
+# Word size labels by np.digitize bin of the box height
+SIZE_NAMES = ("small", "medium", "large")
+
+# Batch API jobs submitted by an earlier run and not yet collected
+BATCH_FILE = Path("hybrid_ocr_batches.json")
+
+VISION_PROMPT = """Analyze this image and extract ALL visible text with approximate positions.
 
 For each piece of text you find, provide:
 1. The exact text content
@@ -66,111 +93,419 @@ Format your response as a JSON array like this:
 
 Be thorough - extract ALL text including titles, headers, buttons, labels, captions, and any other visible text."""
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}",
-                                "detail": "high"
-                            }
+
+app = Flask(__name__)
+
+# Seconds the browser may reuse a served page image without asking again
+IMAGE_MAX_AGE = 24 * 60 * 60
+
+# Global storage for processed images, by file name for the viewer
+processed_images = {}
+
+# Results by image content hash, so renamed or regenerated files are recognised.
+# One row per image, so saving a page doesn't rewrite the whole cache
+CACHE_DB = Path("hybrid_ocr_cache.sqlite")
+cache_db = None
+
+# Earlier versions kept the whole cache in one JSON file
+LEGACY_CACHE_FILE = Path("hybrid_ocr_cache.json")
+
+# tesserocr APIs aren't thread-safe, so each OCR worker thread gets its own
+tesseract_apis = threading.local()
+
+# Column tiles are OCRed on one long-lived pool, so its threads keep their
+# tesserocr APIs (and loaded models) from page to page
+column_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+def setup_openai():
+    """Setup OpenAI client with API key."""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        print("❌ OPENAI_API_KEY environment variable not set")
+        return None
+    # Retries are handled by create_vision_completion, honouring Retry-After
+    return openai.AsyncOpenAI(api_key=api_key, max_retries=0)
+
+
+def encode_image(image_path):
+    """Encode image to base64 for OpenAI API, returning (base64, media_type).
+    
+    Scans larger than GPT-4o's high-detail size are downscaled and re-encoded
+    as JPEG, which cuts the request body and upload time. Anything smaller is
+    sent as the original file.
+    """
+    with Image.open(image_path) as image:
+        if max(image.size) > MAX_IMAGE_EDGE:
+            image.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, "JPEG", quality=88)
+            return base64.b64encode(buffer.getvalue()).decode('ascii'), "image/jpeg"
+    
+    # Files this small are cheaper to encode in one call than to stream in chunks
+    encoded = base64.b64encode(Path(image_path).read_bytes())
+    
+    # Determine media type, defaulting to PNG
+    media_type = MEDIA_TYPES.get(Path(image_path).suffix.lower(), "image/png")
+    return encoded.decode('ascii'), media_type
+
+
+exponential_backoff = wait_exponential(multiplier=1, min=1, max=MAX_RETRY_WAIT)
+
+
+def is_retryable(error):
+    """True for rate limits, connection failures and transient server errors."""
+    return isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def wait_for_retry_after(retry_state):
+    """Wait as long as the API's Retry-After header asks, else back off exponentially."""
+    response = getattr(retry_state.outcome.exception(), 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), MAX_RETRY_WAIT)
+    except (TypeError, ValueError):
+        return exponential_backoff(retry_state)
+
+
+def report_retry(retry_state):
+    """Let the user know a transient failure is being retried."""
+    error = retry_state.outcome.exception()
+    print(f"⏳ {type(error).__name__}, retrying in {retry_state.next_action.sleep:.1f}s...")
+
+
+@retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_for_retry_after,
+    stop=stop_after_attempt(4),
+    before_sleep=report_retry,
+    reraise=True
+)
+async def create_vision_completion(client, base64_image, media_type):
+    """Send one image to GPT-4o, retrying rate limits and transient errors.
+    
+    The reply is streamed and the stream closed as soon as it holds a complete
+    JSON array, so any commentary the model adds afterwards isn't waited on.
+    """
+    chunks = []
+    stream = await client.chat.completions.create(**vision_request(base64_image, media_type), stream=True)
+    async with stream:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            chunks.append(delta)
+            
+            # The array can only be complete once a ']' has arrived
+            if ']' in delta:
+                response_text = "".join(chunks)
+                start = response_text.find('[')
+                if start < 0:
+                    continue
+                try:
+                    JSON_DECODER.raw_decode(response_text, start)
+                    return response_text
+                except json.JSONDecodeError:
+                    # Not closed yet, or the bracket was inside a string
+                    pass
+    
+    return "".join(chunks)
+
+
+def vision_request(base64_image, media_type):
+    """Chat completion parameters for extracting positioned text from one image."""
+    return {
+        "model": VISION_MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": VISION_PROMPT},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{media_type};base64,{base64_image}",
+                            "detail": "high"
                         }
-                    ]
-                }
-            ],
-            max_tokens=1500
-        )
-        
-        response_text = response.choices[0].message.content
+                    }
+                ]
+            }
+        ],
+        "max_tokens": 1500
+    }
+
+
+def parse_vision_response(response_text):
+    """Turn GPT-4o's reply into a list of text elements."""
+    # Try to extract JSON from response, decoding from the first '[' to the end of that array
+    try:
+        start = response_text.find('[')
+        if start >= 0:
+            extracted_data, _ = JSON_DECODER.raw_decode(response_text, start)
+            return extracted_data
+        else:
+            return json.loads(response_text)
+            
+    except json.JSONDecodeError:
+        print("Could not parse OpenAI response as JSON, using fallback...")
+        return parse_text_manually(response_text)
+
+
+async def extract_text_with_openai(client, image_path, content_hash):
+    """Extract text using OpenAI Vision with position estimation (for complex layouts).
+    
+    Replies are cached by image content, so identical covers (or a --reprocess
+    run) don't call the API again.
+    """
+    
+    try:
+        cached = load_cached_result(content_hash, VISION_MODEL)
+        if cached:
+            print(f"💾 Using cached Vision response for {Path(image_path).name}")
+            return parse_vision_response(cached['response_text'])
         
-        # Try to extract JSON from response
-        try:
-            json_match = re.search(r'\[.*?\]', response_text, re.DOTALL)
-            if json_match:
-                json_text = json_match.group(0)
-                extracted_data = json.loads(json_text)
-                return extracted_data
-            else:
-                return json.loads(response_text)
-                
-        except json.JSONDecodeError:
-            print("Could not parse OpenAI response as JSON, using fallback...")
-            return parse_text_manually(response_text)
+        base64_image, media_type = await asyncio.to_thread(encode_image, image_path)
+        response_text = await create_vision_completion(client, base64_image, media_type)
+        save_cached_result(content_hash, VISION_MODEL, {'response_text': response_text})
+        return parse_vision_response(response_text)
             
     except Exception as e:
         print(f"Error calling OpenAI: {e}")
         return []
 
 
-def extract_text_with_analytical_ocr(image_path, psm_mode=3):
-    """Extract text using analytical OCR with bounding boxes (for dense text content)."""
+def load_pending_batches():
+    """Load {batch_id: [image_path, ...]} for Batch API jobs not yet collected."""
+    if BATCH_FILE.exists():
+        try:
+            with open(BATCH_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading pending batches: {e}")
+    return {}
+
+
+def save_pending_batches(pending):
+    """Save the Batch API jobs still waiting to be collected."""
+    try:
+        with open(BATCH_FILE, 'w', encoding='utf-8') as f:
+            json.dump(pending, f, indent=2)
+    except Exception as e:
+        print(f"Error saving pending batches: {e}")
+
+
+async def extract_text_batch_openai(client, image_paths):
+    """Submit covers to the OpenAI Batch API; results are collected on a later run.
+    
+    Batch requests cost half as much as individual calls but can take up to
+    24 hours, so this only records the batch ID.
+    """
+    try:
+        lines = []
+        for image_path in image_paths:
+            lines.append(json.dumps({
+                "custom_id": str(image_path),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": vision_request(*encode_image(image_path))
+            }))
+        
+        batch_input = await client.files.create(
+            file=("hybrid_ocr_covers.jsonl", "\n".join(lines).encode('utf-8')),
+            purpose="batch"
+        )
+        batch = await client.batches.create(
+            input_file_id=batch_input.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        
+        pending = load_pending_batches()
+        pending[batch.id] = [str(image_path) for image_path in image_paths]
+        save_pending_batches(pending)
+        print(f"Submitted {len(image_paths)} covers as batch {batch.id}; run again later to collect results")
+        return batch.id
+        
+    except Exception as e:
+        print(f"Error submitting OpenAI batch: {e}")
+        return None
+
+
+async def collect_batch_results():
+    """Store results from finished Batch API jobs, returning how many images were collected."""
+    pending = load_pending_batches()
+    if not pending:
+        return 0
+    
+    client = setup_openai()
+    if not client:
+        return 0
+    
+    collected = 0
+    try:
+        for batch_id, image_paths in list(pending.items()):
+            try:
+                batch = await client.batches.retrieve(batch_id)
+                if batch.status in ('failed', 'expired', 'cancelled'):
+                    print(f"Batch {batch_id} {batch.status}; its covers will be processed again")
+                    del pending[batch_id]
+                    continue
+                if batch.status != 'completed':
+                    print(f"Batch {batch_id} still {batch.status}")
+                    continue
+                
+                output = await client.files.content(batch.output_file_id) if batch.output_file_id else None
+                for line in (output.text.splitlines() if output else []):
+                    entry = json.loads(line)
+                    image_path = entry['custom_id']
+                    response = entry.get('response') or {}
+                    if response.get('status_code') != 200:
+                        print(f"Batch request failed for {Path(image_path).name}")
+                        continue
+                    response_text = response['body']['choices'][0]['message']['content']
+                    content_hash = file_sha256(image_path)
+                    save_cached_result(content_hash, VISION_MODEL, {'response_text': response_text})
+                    store_result(image_path, content_hash, parse_vision_response(response_text), "openai_vision")
+                    collected += 1
+                del pending[batch_id]
+                
+            except Exception as e:
+                print(f"Error collecting batch {batch_id}: {e}")
+    finally:
+        await client.close()
+        save_pending_batches(pending)
+    
+    if collected:
+        print(f"Collected {collected} results from the OpenAI Batch API")
+    return collected
+
+
+def get_tesseract_api():
+    """This thread's tesserocr API, created (and its model loaded) on first use."""
+    if not hasattr(tesseract_apis, 'api'):
+        tesseract_apis.api = PyTessBaseAPI()
+    return tesseract_apis.api
+
+
+def ocr_hocr_words(source, psm_mode):
+    """OCR an image file or PIL image, returning the texts, boxes and confidences of its HOCR words."""
+    
+    # Use specified PSM mode with LSTM engine
+    config = f"--psm {psm_mode} --oem 3"
+    
+    # Get HOCR output with bounding boxes
+    if PyTessBaseAPI is None:
+        if not isinstance(source, Image.Image):
+            source = str(source)
+        hocr_output = pytesseract.image_to_pdf_or_hocr(source, config=config, extension='hocr')
+    else:
+        # SetImage/SetImageFile clear the previous page's result before the new PSM applies
+        api = get_tesseract_api()
+        if isinstance(source, Image.Image):
+            api.SetImage(source)
+        else:
+            api.SetImageFile(str(source))
+        api.SetPageSegMode(psm_mode)
+        hocr_output = api.GetHOCRText(0)
+    
+    # Parse HOCR
+    root = etree.HTML(hocr_output)
+    
+    # Extract words with bounding boxes and confidence
+    texts, boxes, confidences = [], [], []
+    for span in root.iterfind('.//span[@class="ocrx_word"]'):
+        match = HOCR_TITLE_RE.search(span.get('title', ''))
+        if not match:
+            continue
+        text = ''.join(span.itertext()).strip()
+        if text:
+            x0, y0, x1, y1, confidence = map(int, match.groups())
+            texts.append(text)
+            boxes.append((x0, y0, x1, y1))
+            confidences.append(confidence)
+    return texts, boxes, confidences
+
+
+def column_splits(image, columns):
+    """x positions cutting the page into columns, each at the brightest gutter near an even split."""
+    # Mean brightness of every pixel column; gutters are the near-white runs
+    profile = np.asarray(image.convert('L')).mean(axis=0)
+    width = len(profile)
+    window = width // (columns * 5)
+    
+    splits = [0]
+    for i in range(1, columns):
+        start = width * i // columns - window
+        splits.append(start + int(np.argmax(profile[start:start + 2 * window + 1])))
+    splits.append(width)
+    return splits
+
+
+def extract_text_with_analytical_ocr(image_path, psm_mode=3, columns=1):
+    """Extract text using analytical OCR with bounding boxes (for dense text content).
+    
+    With columns > 1 the page is cut at its column gutters and the columns
+    are OCRed in parallel.
+    """
     
     try:
         print(f"Using analytical OCR (PSM {psm_mode}) for: {image_path}")
         
-        # Load image
-        image = Image.open(image_path)
-        image_width, image_height = image.size
+        # Unless it's cut into columns, only the header is read for the size and
+        # Tesseract decodes the file itself
+        with Image.open(image_path) as image:
+            image_width, image_height = image.size
+            if columns > 1:
+                splits = column_splits(image, columns)
+                tiles = [image.crop((x0, 0, x1, image_height)) for x0, x1 in zip(splits, splits[1:])]
+        
+        if columns > 1:
+            tile_words = list(column_executor.map(ocr_hocr_words, tiles, [psm_mode] * len(tiles)))
+            
+            # Shift each column's boxes back to page coordinates
+            texts, boxes, confidences = [], [], []
+            for x_offset, (tile_texts, tile_boxes, tile_confidences) in zip(splits, tile_words):
+                texts.extend(tile_texts)
+                boxes.extend((x0 + x_offset, y0, x1 + x_offset, y1) for x0, y0, x1, y1 in tile_boxes)
+                confidences.extend(tile_confidences)
+        else:
+            texts, boxes, confidences = ocr_hocr_words(image_path, psm_mode)
         
-        # Use specified PSM mode with LSTM engine
-        config = f"--psm {psm_mode} --oem 3"
+        boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+        confidences = np.array(confidences, dtype=np.int32)
         
-        # Get HOCR output with bounding boxes
-        hocr_output = pytesseract.image_to_pdf_or_hocr(image, config=config, extension='hocr')
+        # Filter out low confidence and likely false positives
+        plausible = np.fromiter(
+            (len(text) >= 2 and  # At least 2 characters
+             any(c.isalnum() for c in text) and  # Contains at least one letter/number
+             not all(c in SYMBOL_CHARS for c in text)  # Not all symbols
+             for text in texts),
+            dtype=bool, count=len(texts)
+        )
+        keep = (confidences >= 70) & plausible  # Minimum 70% confidence
         
-        # Parse HOCR
-        soup = BeautifulSoup(hocr_output, 'html.parser')
+        # Convert absolute coordinates to percentages
+        x_percents = boxes[:, 0] * (100.0 / image_width)
+        y_percents = boxes[:, 1] * (100.0 / image_height)
         
-        extracted_data = []
+        # Determine size from box height: above 20px large, above 12px medium
+        sizes = np.digitize(boxes[:, 3] - boxes[:, 1], [13, 21])
         
-        # Extract words with bounding boxes and confidence
-        for span in soup.find_all('span', class_='ocrx_word'):
-            if 'title' in span.attrs:
-                title = span['title']
-                bbox_part = [part for part in title.split(';') if 'bbox' in part]
-                conf_part = [part for part in title.split(';') if 'x_wconf' in part]
-                
-                if bbox_part:
-                    coords = list(map(int, bbox_part[0].split()[1:5]))
-                    text = span.get_text().strip()
-                    confidence = int(conf_part[0].split()[-1]) if conf_part else 0
-                    
-                    # Filter out low confidence and likely false positives
-                    if (text and 
-                        confidence >= 70 and  # Minimum 70% confidence
-                        len(text) >= 2 and    # At least 2 characters
-                        not all(c in '!@#$%^&*()_+-=[]{}|\\:";\'<>?,./' for c in text) and  # Not all symbols
-                        any(c.isalnum() for c in text)):  # Contains at least one letter/number
-                        
-                        # Convert absolute coordinates to percentages
-                        x_percent = (coords[0] / image_width) * 100
-                        y_percent = (coords[1] / image_height) * 100
-                        
-                        # Determine size based on bounding box dimensions
-                        width = coords[2] - coords[0]
-                        height = coords[3] - coords[1]
-                        
-                        if height > 20:
-                            size = "large"
-                        elif height > 12:
-                            size = "medium"
-                        else:
-                            size = "small"
-                        
-                        extracted_data.append({
-                            "text": text,
-                            "x_percent": x_percent,
-                            "y_percent": y_percent,
-                            "size": size,
-                            "type": "text",
-                            "confidence": confidence,
-                            "bbox": coords
-                        })
+        extracted_data = [
+            {
+                "text": texts[index],
+                "x_percent": x_percent,
+                "y_percent": y_percent,
+                "size": SIZE_NAMES[size],
+                "type": "text",
+                "confidence": confidence,
+                "bbox": box
+            }
+            for index, x_percent, y_percent, size, confidence, box in zip(
+                np.flatnonzero(keep).tolist(), x_percents[keep].tolist(), y_percents[keep].tolist(),
+                sizes[keep].tolist(), confidences[keep].tolist(), boxes[keep].tolist()
+            )
+        ]
         
         print(f"Analytical OCR extracted {len(extracted_data)} text elements")
         return extracted_data
@@ -218,13 +553,11 @@ def extract_text_with_local_ocr_enhanced(image_path):
 
 def parse_text_manually(response_text):
     """Manual parsing fallback if JSON parsing fails."""
-    import re
-    
     lines = response_text.split('\n')
     results = []
     
     for line in lines:
-        quotes = re.findall(r'"([^"]+)"', line)
+        quotes = QUOTED_TEXT_RE.findall(line)
         for quote in quotes:
             if len(quote) > 2:
                 results.append({
@@ -238,6 +571,13 @@ def parse_text_manually(response_text):
     return results
 
 
+@functools.lru_cache(maxsize=None)
+def first_png(directory):
+    """First PNG in the directory by sorted name, scanned once per directory per run."""
+    png_files = sorted(Path(directory).glob("*.png"))
+    return str(png_files[0]) if png_files else None
+
+
 def is_complex_layout(image_path):
     """Determine if this image has complex layout requiring AI analysis."""
     image_name = Path(image_path).name.lower()
@@ -252,8 +592,7 @@ def is_complex_layout(image_path):
     ]
     
     # Check if it's the first file (sorted) - often covers/title pages
-    png_files = sorted(list(Path(image_path).parent.glob("*.png")))
-    if png_files and str(png_files[0]) == str(image_path):
+    if first_png(str(Path(image_path).parent)) == str(image_path):
         return True
     
     # Check filename patterns
@@ -264,71 +603,171 @@ def is_complex_layout(image_path):
     return False
 
 
+def open_cache():
+    """Open the SQLite result cache, creating it on first use."""
+    global cache_db
+    if cache_db is None:
+        # Autocommit, so every result is on disk as soon as it's stored
+        cache_db = sqlite3.connect(CACHE_DB, isolation_level=None)
+        cache_db.execute("PRAGMA journal_mode=WAL")
+        cache_db.execute("CREATE TABLE IF NOT EXISTS cache(key TEXT PRIMARY KEY, data BLOB, image_path TEXT)")
+        columns = [row[1] for row in cache_db.execute("PRAGMA table_info(cache)")]
+        if 'image_path' not in columns:
+            # Caches created before rows were tied to their file; fill the column in from the data
+            cache_db.execute("ALTER TABLE cache ADD COLUMN image_path TEXT")
+            for key, data in cache_db.execute("SELECT key, data FROM cache").fetchall():
+                cache_db.execute("UPDATE cache SET image_path = ? WHERE key = ?",
+                                 (json.loads(data)['image_path'], key))
+        cache_db.execute("CREATE INDEX IF NOT EXISTS cache_image_path ON cache(image_path)")
+    return cache_db
+
+
 def load_cached_results():
-    """Load previously processed results from cache file."""
-    cache_file = Path("hybrid_ocr_cache.json")
-    if cache_file.exists():
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-                processed_images.update(cached_data)
-                print(f"Loaded {len(cached_data)} cached results from {cache_file}")
-                return True
-        except Exception as e:
-            print(f"Error loading cache: {e}")
+    """Load previously processed results from the cache, importing an old JSON cache once."""
+    try:
+        db = open_cache()
+        if LEGACY_CACHE_FILE.exists() and not db.execute("SELECT 1 FROM cache LIMIT 1").fetchone():
+            with open(LEGACY_CACHE_FILE, 'r', encoding='utf-8') as f:
+                legacy_data = json.load(f)
+            for key, entry in legacy_data.items():
+                # Caches written before content hashing are keyed by file name; hash
+                # the file if it's still there so load_result can find the entry
+                if 'content_hash' not in entry and Path(entry['image_path']).exists():
+                    entry['content_hash'] = file_sha256(entry['image_path'])
+                save_result(entry.get('content_hash', key), entry)
+            print(f"Imported {len(legacy_data)} cached results from {LEGACY_CACHE_FILE}")
+        
+        # Oldest first, so the latest result for a file name wins
+        rows = db.execute("SELECT data FROM cache ORDER BY rowid").fetchall()
+        for (data,) in rows:
+            entry = json.loads(data)
+            processed_images[Path(entry['image_path']).name] = entry
+        if rows:
+            print(f"Loaded {len(rows)} cached results from {CACHE_DB}")
+            return True
+    except Exception as e:
+        print(f"Error loading cache: {e}")
     return False
 
 
-def save_cached_results():
-    """Save processed results to cache file."""
-    cache_file = Path("hybrid_ocr_cache.json")
+def load_result(content_hash):
+    """Return the cached result for an image's content hash, or None."""
     try:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(processed_images, f, indent=2, ensure_ascii=False)
-        print(f"Saved {len(processed_images)} results to {cache_file}")
+        row = open_cache().execute("SELECT data FROM cache WHERE key = ?", (content_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        print(f"Error reading cache: {e}")
+        return None
+
+
+def save_result(content_hash, result):
+    """Write one image's result to the cache, replacing the row for that file's previous content."""
+    try:
+        db = open_cache()
+        image_path = str(result['image_path'])
+        db.execute("DELETE FROM cache WHERE image_path = ? AND key != ?", (image_path, content_hash))
+        db.execute("INSERT OR REPLACE INTO cache(key, data, image_path) VALUES (?, ?, ?)",
+                   (content_hash, json.dumps(result, ensure_ascii=False).encode('utf-8'), image_path))
     except Exception as e:
         print(f"Error saving cache: {e}")
 
 
-def process_image(image_path, force_reprocess=False, local_only=False):
-    """Process image with appropriate OCR method and store results."""
+async def process_image(image_path, force_reprocess=False, local_only=False, client=None, semaphore=None,
+                        launch_delay=0, psm_mode=3, columns=1):
+    """Process image with appropriate OCR method and store results.
+    
+    Tesseract work runs in the event loop's thread pool; OpenAI requests use the
+    async client, starting after launch_delay seconds, with the semaphore
+    capping how many are in flight. psm_mode and columns apply to analytical OCR.
+    """
     
     image_name = Path(image_path).name
+    content_hash = await asyncio.to_thread(file_sha256, image_path)
     
-    # Check if already processed (unless forced)
-    if not force_reprocess and image_name in processed_images:
+    # Check if this exact image was already processed, under any name (unless forced)
+    cached = None if force_reprocess else load_result(content_hash)
+    if cached:
         print(f"Using cached result for {image_name}")
-        return processed_images[image_name]
+        return store_result(image_path, content_hash, cached['text_data'], cached['method'])
     
     # Determine processing method
     if local_only:
         print(f"Local-only mode - using enhanced Tesseract OCR: {image_name}")
-        text_data = extract_text_with_local_ocr_enhanced(image_path)
+        text_data = await asyncio.to_thread(extract_text_with_local_ocr_enhanced, image_path)
         method = "enhanced_local_ocr"
     elif is_complex_layout(image_path):
         print(f"Detected complex layout - attempting AI Vision: {image_name}")
-        client = setup_openai()
         if not client:
             print("AI not available, using enhanced local OCR")
-            text_data = extract_text_with_local_ocr_enhanced(image_path)
+            text_data = await asyncio.to_thread(extract_text_with_local_ocr_enhanced, image_path)
             method = "enhanced_local_ocr_fallback"
         else:
-            text_data = extract_text_with_openai(client, image_path)
+            await asyncio.sleep(launch_delay)
+            async with semaphore:
+                text_data = await extract_text_with_openai(client, image_path, content_hash)
             method = "openai_vision"
     else:
         print(f"Detected standard layout - using analytical OCR: {image_name}")
-        text_data = extract_text_with_analytical_ocr(image_path)
+        text_data = await asyncio.to_thread(extract_text_with_analytical_ocr, image_path, psm_mode, columns)
         method = "analytical_ocr"
     
-    # Store results
-    processed_images[image_name] = {
+    return store_result(image_path, content_hash, text_data, method)
+
+
+def store_result(image_path, content_hash, text_data, method):
+    """Record an image's OCR result under both its file name and its content hash."""
+    result = {
         'image_path': image_path,
+        'content_hash': content_hash,
         'text_data': text_data,
         'total_texts': len(text_data),
         'method': method
     }
+    processed_images[Path(image_path).name] = result
+    save_result(content_hash, result)
+    return result
+
+
+async def process_images(image_paths, force_reprocess=False, local_only=False, use_batch=False,
+                         psm_mode=3, columns=1):
+    """Process all images concurrently, returning one result (or exception) per path.
+    
+    With use_batch and more than one cover, the covers go to the Batch API
+    instead and come back as None until a later run collects them.
+    """
+    
+    # pytesseract waits on a subprocess, so one thread per core keeps every core busy
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=os.cpu_count()))
+    
+    # Only set up OpenAI if some page will actually go to AI Vision
+    needs_ai = not local_only and any(is_complex_layout(str(path)) for path in image_paths)
+    client = setup_openai() if needs_ai else None
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_VISION_REQUESTS)
     
-    return processed_images[image_name]
+    # Covers already in a submitted batch wait for it rather than being sent again
+    batched = {image_path for paths in load_pending_batches().values() for image_path in paths}
+    if client and use_batch:
+        covers = [path for path in image_paths if is_complex_layout(str(path)) and str(path) not in batched]
+        if len(covers) > 1 and await extract_text_batch_openai(client, covers):
+            batched.update(str(path) for path in covers)
+    
+    # Stagger the covers that start straight away; later ones already wait their
+    # turn on the semaphore
+    direct_covers = [path for path in image_paths if is_complex_layout(str(path)) and str(path) not in batched]
+    launch_delays = {path: min(i, MAX_CONCURRENT_VISION_REQUESTS - 1) * VISION_LAUNCH_STAGGER
+                     for i, path in enumerate(direct_covers)}
+    
+    async def run(path):
+        if str(path) in batched and not local_only:
+            return None
+        return await process_image(str(path), force_reprocess, local_only, client, semaphore,
+                                   launch_delays.get(path, 0), psm_mode, columns)
+    
+    try:
+        return await asyncio.gather(*(run(path) for path in image_paths), return_exceptions=True)
+    finally:
+        if client:
+            await client.close()
 
 
 @app.route('/')
@@ -353,7 +792,9 @@ def view_image(image_name):
 @app.route('/images/<path:filename>')
 def serve_image(filename):
     """Serve image files."""
-    return send_from_directory('.', filename)
+    # Pages don't change once scanned, so let the browser keep them for a day
+    # and revalidate with the ETag/Last-Modified headers after that
+    return send_from_directory('.', filename, conditional=True, max_age=IMAGE_MAX_AGE)
 
 
 @app.route('/api/text_data/<image_name>')
@@ -365,7 +806,7 @@ def get_text_data(image_name):
 
 
 def create_templates():
-    """Create HTML templates for the hybrid OCR interface."""
+    """Create HTML templates for the hybrid OCR interface, if missing or out of date."""
     
     templates_dir = Path("templates")
     templates_dir.mkdir(exist_ok=True)
@@ -700,12 +1141,13 @@ def create_templates():
 </body>
 </html>'''
     
-    # Write templates with UTF-8 encoding
-    with open(templates_dir / "hybrid_viewer.html", "w", encoding='utf-8') as f:
-        f.write(index_template)
-    
-    with open(templates_dir / "hybrid_image_viewer.html", "w", encoding='utf-8') as f:
-        f.write(viewer_template)
+    # Write templates with UTF-8 encoding, leaving unchanged ones alone so
+    # Flask's template cache and the files' mtimes survive a restart
+    for name, template in (("hybrid_viewer.html", index_template),
+                           ("hybrid_image_viewer.html", viewer_template)):
+        template_path = templates_dir / name
+        if not template_path.exists() or template_path.read_text(encoding='utf-8') != template:
+            template_path.write_text(template, encoding='utf-8')
 
 
 def main():
@@ -717,6 +1159,8 @@ def main():
     parser.add_argument('--cache-only', action='store_true', help='Only use cached results, no new processing')
     parser.add_argument('--local-only', action='store_true', help='Use only local Tesseract OCR (no AI APIs)')
     parser.add_argument('--content-page', help='Specific content page to process (e.g., 033)')
+    parser.add_argument('--columns', type=int, default=1, help='Split content pages into this many columns and OCR them in parallel')
+    parser.add_argument('--batch', action='store_true', help='Send covers through the OpenAI Batch API (half price, collected on a later run)')
     args = parser.parse_args()
     
     # Create templates
@@ -725,6 +1169,10 @@ def main():
     # Load cached results first
     load_cached_results()
     
+    # Pick up covers from any Batch API jobs that have finished since the last run
+    if not args.cache_only and not args.local_only:
+        asyncio.run(collect_batch_results())
+    
     if args.cache_only:
         print("Cache-only mode: using existing cached results")
         if not processed_images:
@@ -740,6 +1188,11 @@ def main():
         # Determine which images to process
         images_to_process = []
         
+        # A content page asked for by name is plain running text, so skip Tesseract's
+        # full layout analysis for it; words are placed by their boxes, so reading
+        # order across columns doesn't matter
+        psm_mode = 6 if args.content_page else 3
+        
         if args.reprocess:
             print("Reprocessing mode: will reprocess all cached images")
             for image_name in processed_images.keys():
@@ -783,16 +1236,17 @@ def main():
         if images_to_process:
             print(f"\nProcessing {len(images_to_process)} images with hybrid OCR...")
             
-            for image_path in images_to_process:
-                print(f"\nProcessing {image_path.name}...")
-                result = process_image(str(image_path), force_reprocess=args.reprocess, local_only=args.local_only)
-                if result:
-                    print(f"  Success: {result['total_texts']} text elements found using {result['method']}")
-                else:
-                    print(f"  Failed to process {image_path.name}")
+            results = asyncio.run(process_images(images_to_process, force_reprocess=args.reprocess,
+                                                 local_only=args.local_only, use_batch=args.batch,
+                                                 psm_mode=psm_mode, columns=args.columns))
             
-            # Save updated cache
-            save_cached_results()
+            for image_path, result in zip(images_to_process, results):
+                if result is None:
+                    print(f"  {image_path.name}: waiting on the OpenAI Batch API")
+                elif not isinstance(result, BaseException):
+                    print(f"  {image_path.name}: {result['total_texts']} text elements found using {result['method']}")
+                else:
+                    print(f"  Failed to process {image_path.name}: {result}")
         else:
             print("All selected images already processed (cached)")
     
@@ -808,7 +1262,9 @@ def main():
         print(f"   python hybrid_ocr_viewer.py --local-only           (use only Tesseract, no AI)")
         print(f"   python hybrid_ocr_viewer.py --reprocess            (reprocess all images)")
         print(f"   python hybrid_ocr_viewer.py --content-page 033     (process specific page)")
+        print(f"   python hybrid_ocr_viewer.py --content-page 033 --columns 2  (OCR its two columns in parallel)")
         print(f"   python hybrid_ocr_viewer.py --local-only --reprocess  (reprocess with local OCR only)")
+        print(f"   python hybrid_ocr_viewer.py --batch                (send covers via the OpenAI Batch API)")
         
         # Add processed_images to app context for templates
         app.jinja_env.globals['processed_images'] = processed_images
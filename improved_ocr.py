@@ -3,59 +3,155 @@
 Improved OCR script using your existing setup with better preprocessing.
 """
 
+import functools
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import argparse
 import pytesseract
 from PIL import Image, ImageOps, ImageFilter, ImageEnhance
 
+try:
+    # tesserocr keeps the model loaded between approaches; optional
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+# Each tesseract process spawns up to 4 OpenMP threads by default; pin it to one
+# so the approaches we run side by side don't oversubscribe the CPU
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# tesserocr APIs aren't thread-safe, so each thread gets its own
+tesseract_apis = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def threshold_table(level: int) -> list:
+    """Lookup table for Image.point: white above the gray level, black at or below it.
+    
+    Built once per level, so Pillow doesn't call a Python lambda 256 times per image.
+    """
+    return [255 if p > level else 0 for p in range(256)]
+
 
 def preprocess_for_text_clarity(img: Image.Image, strategy: str = "default") -> Image.Image:
-    """Apply preprocessing specifically to improve text clarity."""
+    """Apply preprocessing specifically to improve text clarity.
     
-    if strategy == "high_contrast_threshold":
-        # Convert to grayscale
+    Every strategy works in grayscale, so an 'L' image is used as it is;
+    anything else is converted first.
+    """
+    
+    # Convert to grayscale
+    if img.mode != 'L':
         img = ImageOps.grayscale(img)
+    
+    if strategy == "high_contrast_threshold":
         # Increase contrast significantly
         img = ImageEnhance.Contrast(img).enhance(2.5)
         # Apply binary threshold
-        img = img.point(lambda p: 255 if p > 140 else 0)
+        img = img.point(threshold_table(140))
         
     elif strategy == "gentle_enhancement":
-        img = ImageOps.grayscale(img)
         img = ImageEnhance.Contrast(img).enhance(1.3)
-        img = img.point(lambda p: 255 if p > 160 else 0)
+        img = img.point(threshold_table(160))
         
     elif strategy == "sharp_threshold":
-        img = ImageOps.grayscale(img)
         img = img.filter(ImageFilter.SHARPEN)
-        img = img.point(lambda p: 255 if p > 130 else 0)
+        img = img.point(threshold_table(130))
         
     elif strategy == "denoise_threshold":
-        img = ImageOps.grayscale(img)
         # Apply a slight blur to reduce noise
         img = img.filter(ImageFilter.MedianFilter(size=3))
         img = ImageEnhance.Contrast(img).enhance(1.8)
-        img = img.point(lambda p: 255 if p > 150 else 0)
+        img = img.point(threshold_table(150))
         
     elif strategy == "minimal":
         # Just grayscale conversion
-        img = ImageOps.grayscale(img)
+        pass
         
     else:  # default
-        img = ImageOps.grayscale(img)
         img = ImageEnhance.Contrast(img).enhance(1.5)
-        img = img.point(lambda p: 255 if p > 150 else 0)
+        img = img.point(threshold_table(150))
     
     return img
 
 
-def extract_text_multiple_ways(image_path: Path, target_text: str = None) -> dict:
-    """Try multiple preprocessing and OCR configurations."""
+def get_tesseract_api():
+    """This thread's tesserocr API, created (and its model loaded) on first use."""
+    if not hasattr(tesseract_apis, 'api'):
+        tesseract_apis.api = PyTessBaseAPI()
+    return tesseract_apis.api
+
+
+def ocr_text(image: Image.Image, psm: int) -> str:
+    """OCR an image with the given page segmentation mode."""
+    if PyTessBaseAPI is None:
+        return pytesseract.image_to_string(image, config=f"--psm {psm}")
+    
+    # SetImage clears the previous result, so only the PSM needs resetting
+    api = get_tesseract_api()
+    api.SetImage(image)
+    api.SetPageSegMode(psm)
+    return api.GetUTF8Text()
+
+
+def run_approach(img: Image.Image, approach: dict, target_text: str = None):
+    """Preprocess and OCR the image one way, returning the scored result (None on error)."""
+    try:
+        # Preprocess image; every step returns a new image, so the shared one needs no copy
+        processed_img = preprocess_for_text_clarity(img, approach["name"])
+        
+        # Try OCR with this configuration
+        text = ocr_text(processed_img, approach['psm'])
+        
+        # Score the result
+        text_clean = text.strip()
+        text_upper = text_clean.upper()
+        score = len(text_clean)
+        has_target = False
+        
+        if target_text:
+            target_upper = target_text.upper()
+            
+            # Bonus for target text presence
+            has_target = target_upper in text_upper
+            if has_target:
+                score += 1000
+            
+            # Check for partial matches (as substrings, so OCR'd punctuation
+            # stuck to a word doesn't hide it)
+            found_words = sum(1 for word in target_upper.split() if word in text_upper)
+            score += found_words * 50
+        
+        return {
+            "strategy": f"{approach['name']}_psm{approach['psm']}",
+            "text": text_clean,
+            "score": score,
+            "length": len(text_clean),
+            "has_target": has_target
+        }
+        
+    except Exception as e:
+        print(f"Error with {approach['name']}_psm{approach['psm']}: {e}", file=sys.stderr)
+        return None
+
+
+def extract_text_multiple_ways(image_path: Path, target_text: str = None, max_approaches: int = None) -> dict:
+    """Try multiple preprocessing and OCR configurations.
+    
+    With a target, approaches run in waves of one per worker and later waves are
+    skipped once one finds the whole target text, which is what a caller passing
+    a target is after; max_approaches caps how many are tried at all.
+    """
     
-    img = Image.open(image_path)
+    # Every approach starts from grayscale, so convert once for all of them. The
+    # conversion also decodes the file, which a lazily loaded image shared between
+    # threads would otherwise race to do
+    img = ImageOps.grayscale(Image.open(image_path))
     
-    # Define different approaches
+    # Define different approaches, the ones that most often work first
     approaches = [
         {"name": "minimal", "psm": 6},
         {"name": "minimal", "psm": 3},
@@ -69,41 +165,26 @@ def extract_text_multiple_ways(image_path: Path, target_text: str = None) -> dic
         {"name": "denoise_threshold", "psm": 6},
     ]
     
-    results = []
+    approaches = approaches[:max_approaches]
     
-    for approach in approaches:
-        try:
-            # Preprocess image
-            processed_img = preprocess_for_text_clarity(img.copy(), approach["name"])
-            
-            # Try OCR with this configuration
-            config = f"--psm {approach['psm']}"
-            text = pytesseract.image_to_string(processed_img, config=config)
-            
-            # Score the result
-            text_clean = text.strip()
-            score = len(text_clean)
-            
-            # Bonus for target text presence
-            if target_text and target_text.upper() in text_clean.upper():
-                score += 1000
-                
-            # Check for partial matches
-            if target_text:
-                target_words = target_text.upper().split()
-                found_words = sum(1 for word in target_words if word in text_clean.upper())
-                score += found_words * 50
-            
-            results.append({
-                "strategy": f"{approach['name']}_psm{approach['psm']}",
-                "text": text_clean,
-                "score": score,
-                "length": len(text_clean),
-                "has_target": target_text.upper() in text_clean.upper() if target_text else False
-            })
-            
-        except Exception as e:
-            print(f"Error with {approach['name']}_psm{approach['psm']}: {e}", file=sys.stderr)
+    # Tesseract releases the GIL (or runs in its own subprocess), so threads run the approaches in parallel.
+    # With a target, go in waves of one approach per worker so we can stop between waves
+    workers = os.cpu_count() or 1
+    wave_size = workers if target_text else len(approaches)
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(approaches), wave_size):
+            futures = {executor.submit(run_approach, img, approach, target_text): i
+                       for i, approach in enumerate(approaches[start:start + wave_size], start)}
+            for future in as_completed(futures):
+                outcomes[futures[future]] = future.result()
+            found = next((outcomes[i] for i in sorted(futures) if outcomes[i] and outcomes[i]["has_target"]), None)
+            if found and start + wave_size < len(approaches):
+                print(f"Target found with {found['strategy']}; skipping remaining approaches", file=sys.stderr)
+                break
+    
+    # Keep approach order among equal scores
+    results = [outcomes[i] for i in sorted(outcomes) if outcomes[i] is not None]
     
     # Sort by score
     results.sort(key=lambda x: x["score"], reverse=True)
@@ -119,6 +200,7 @@ def main():
     parser.add_argument("image", help="Path to image file")
     parser.add_argument("--target", help="Target text to look for")
     parser.add_argument("--all", action="store_true", help="Show all results, not just the best")
+    parser.add_argument("--max-approaches", type=int, help="Try at most this many approaches")
     
     args = parser.parse_args()
     
@@ -130,7 +212,7 @@ def main():
     print(f"Processing: {image_path.name}")
     print("=" * 60)
     
-    result = extract_text_multiple_ways(image_path, args.target)
+    result = extract_text_multiple_ways(image_path, args.target, args.max_approaches)
     
     if not result["results"]:
         print("No text extracted by any method.")
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Key terms used to score OCR output against the PrivateEye test cover.
+"""
+
+import re
+
+# Text we expect to find on the cover: masthead, headline and issue number
+KEY_TERMS = ('PRIVATE', 'EYE', 'ANDREW', 'DENIES', 'BEING', 'CHINESE', 'SPY', '1642')
+
+# One pass over the text finds every term; the lookahead lets matches overlap
+# so this behaves exactly like a separate `term in text.upper()` check per term.
+# Matching case-insensitively saves upper-casing a copy of the whole text.
+_KEY_TERM_RE = re.compile('(?=(' + '|'.join(map(re.escape, KEY_TERMS)) + '))', re.IGNORECASE)
+
+
+def find_key_terms(text):
+    """Return the key terms present in text, in KEY_TERMS order."""
+    found = {match.upper() for match in _KEY_TERM_RE.findall(text)}
+    return [term for term in KEY_TERMS if term in found]
+
+
+# A term split across two streamed chunks can start at most this far back
+_MAX_OVERLAP = max(map(len, KEY_TERMS)) - 1
+
+
+def update_key_terms(found, tail, chunk):
+    """Add key terms from a streamed chunk to the `found` set.
+
+    `tail` is the end of the text seen so far, so terms split across chunks
+    still match. Returns the tail to pass in with the next chunk.
+    """
+    window = tail + chunk
+    found.update(find_key_terms(window))
+    return window[-_MAX_OVERLAP:]
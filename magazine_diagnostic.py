@@ -4,16 +4,92 @@ Magazine-specific OCR diagnostic script.
 Focuses on detecting large headlines, mastheads, and varied text sizes.
 """
 
+import html
+import os
 import pytesseract
+import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageEnhance
-from bs4 import BeautifulSoup
+import cv2
+import numpy as np
 import webbrowser
 
+try:
+    # tesserocr keeps the model loaded between configs; optional
+    from tesserocr import PT, RIL, PyTessBaseAPI, iterate_level
+except ImportError:
+    PyTessBaseAPI = None
 
-def test_magazine_specific_configs(image_path: str):
-    """Test configurations optimized for magazine layouts."""
+from result_cache import image_blake2b, load_cached_result, save_cached_result
+
+# Each tesseract process spawns up to 4 OpenMP threads by default; pin it to one
+# so the configs we run side by side don't oversubscribe the CPU
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Tesseract writes every word as <span class='ocrx_word' ... title='bbox x0 y0 x1 y1; ...'>
+HOCR_WORD_RE = re.compile(rb"<span class='ocrx_word'[^>]*?title='bbox (\d+) (\d+) (\d+) (\d+)[^>]*>(.*?)</span>", re.DOTALL)
+HOCR_TEXTFLOAT_RE = re.compile(rb"<span class='ocr_textfloat'[^>]*?title=[\"']bbox (\d+) (\d+) (\d+) (\d+)")
+HTML_TAG_RE = re.compile(rb'<[^>]+>')
+
+# Label font for the visual debug images, loaded once rather than per config; prefer a larger one
+try:
+    LABEL_FONT = ImageFont.truetype("arial.ttf", 16)
+except OSError:
+    try:
+        LABEL_FONT = ImageFont.load_default()
+    except OSError:
+        LABEL_FONT = None
+
+# tesserocr APIs aren't thread-safe, so each thread gets its own
+tesseract_apis = threading.local()
+
+
+def get_tesseract_api():
+    """This thread's tesserocr API, created (and its model loaded) on first use."""
+    if not hasattr(tesseract_apis, 'api'):
+        tesseract_apis.api = PyTessBaseAPI()
+    return tesseract_apis.api
+
+
+def recognize(image: Image.Image, config: str, with_hocr: bool = False):
+    """OCR the image, returning its HOCR (if asked for), (x0, y0, x1, y1, text) words and text float boxes.
+    
+    With tesserocr the words and boxes come straight from the result iterator,
+    so HOCR is only rendered (from the same recognition) for with_hocr.
+    """
+    
+    if PyTessBaseAPI is None:
+        hocr_output = pytesseract.image_to_pdf_or_hocr(image, config=config, extension='hocr')
+        return (hocr_output if with_hocr else None, *parse_hocr(hocr_output))
+    
+    # Magazine configs are '--psm N --oem 3', and OEM 3 is the API's default
+    tokens = config.split()
+    options = dict(zip(tokens[::2], tokens[1::2]))
+    api = get_tesseract_api()
+    api.SetImage(image)
+    api.SetPageSegMode(int(options['--psm']))
+    api.Recognize()
+    
+    words, float_boxes = [], []
+    # There's no iterator at all when nothing was found on the page
+    if api.GetIterator() is not None:
+        for word in iterate_level(api.GetIterator(), RIL.WORD):
+            text = (word.GetUTF8Text(RIL.WORD) or '').strip()
+            if text:
+                words.append((*word.BoundingBox(RIL.WORD), text))
+        # HOCR marks lines of pull-out blocks as ocr_textfloat
+        for line in iterate_level(api.GetIterator(), RIL.TEXTLINE):
+            if line.BlockType() == PT.PULLOUT_TEXT:
+                float_boxes.append(line.BoundingBox(RIL.TEXTLINE))
+    
+    return api.GetHOCRText(0).encode('utf-8') if with_hocr else None, words, float_boxes
+
+
+def test_magazine_specific_configs(image_path: str, save_hocr: bool = False):
+    """Test configurations optimized for magazine layouts, saving each one's HOCR too with save_hocr."""
     
     configs = [
         # Magazine-specific configurations
@@ -36,72 +112,105 @@ def test_magazine_specific_configs(image_path: str):
     output_dir = Path("magazine_diagnostic")
     output_dir.mkdir(exist_ok=True)
     
-    results = []
+    # Load once; decode up front since a lazily loaded image isn't safe to share between threads
+    image = Image.open(image_path)
+    image.load()
     
-    for i, config in enumerate(configs):
-        config_name = config[0]
-        tesseract_config = config[1]
-        preprocess = config[2] if len(config) > 2 else None
-        
-        print(f"\n{'='*60}")
-        print(f"Testing {i+1}/{len(configs)}: {config_name}")
-        print(f"Config: {tesseract_config}")
-        if preprocess:
-            print(f"Preprocessing: {preprocess}")
+    # Tesseract releases the GIL (or runs in its own subprocess), so threads run the configs
+    # in parallel; results are reported in config order as they finish
+    results = []
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(run_magazine_config, image, i, config, image_name, output_dir, save_hocr)
+                   for i, config in enumerate(configs)]
         
-        try:
-            # Load and preprocess image
-            image = Image.open(image_path)
-            processed_image = preprocess_for_magazine(image, preprocess) if preprocess else image
-            
-            # Generate HOCR
-            hocr_output = pytesseract.image_to_pdf_or_hocr(processed_image, config=tesseract_config, extension='hocr')
+        for i, (config, future) in enumerate(zip(configs, futures)):
+            config_name = config[0]
+            tesseract_config = config[1]
+            preprocess = config[2] if len(config) > 2 else None
             
-            # Save files
-            hocr_path = output_dir / f"{image_name}_{i:02d}_{config_name.replace(' ', '_')}_hocr.html"
-            visual_path = output_dir / f"{image_name}_{i:02d}_{config_name.replace(' ', '_')}_visual.png"
+            print(f"\n{'='*60}")
+            print(f"Testing {i+1}/{len(configs)}: {config_name}")
+            print(f"Config: {tesseract_config}")
+            if preprocess:
+                print(f"Preprocessing: {preprocess}")
             
-            with open(hocr_path, 'wb') as f:
-                f.write(hocr_output)
-            
-            # Create visual debugging
-            word_count = create_visual_debug(processed_image, hocr_path, visual_path)
-            
-            # Extract text
-            text = extract_text_from_hocr_simple(hocr_path)
-            
-            result = {
-                'name': config_name,
-                'config': tesseract_config,
-                'preprocess': preprocess,
-                'word_count': word_count,
-                'text_length': len(text),
-                'text': text,
-                'visual_path': visual_path,
-                'hocr_path': hocr_path,
-                'has_private': 'PRIVATE' in text.upper(),
-                'has_eye': 'EYE' in text.upper(),
-                'has_andrew': 'ANDREW' in text.upper(),
-                'has_1642': '1642' in text,
-            }
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error with {config_name}: {e}")
+                continue
             
             results.append(result)
             
-            print(f"Words detected: {word_count}")
-            print(f"Text length: {len(text)} chars")
+            print(f"Words detected: {result['word_count']}")
+            print(f"Text length: {result['text_length']} chars")
             print(f"Has PRIVATE: {'✓' if result['has_private'] else '✗'}")
             print(f"Has EYE: {'✓' if result['has_eye'] else '✗'}")
             print(f"Has ANDREW: {'✓' if result['has_andrew'] else '✗'}")
             print(f"Has 1642: {'✓' if result['has_1642'] else '✗'}")
-            print(f"Preview: {repr(text[:100])}")
-            
-        except Exception as e:
-            print(f"Error with {config_name}: {e}")
-            continue
+            print(f"Preview: {repr(result['text'][:100])}")
     
     return results
 
 
+def run_magazine_config(image: Image.Image, i: int, config: tuple, image_name: str, output_dir: Path,
+                        save_hocr: bool = False) -> dict:
+    """OCR the image with one magazine config and save its visual debug (and optionally HOCR) file."""
+    
+    config_name = config[0]
+    tesseract_config = config[1]
+    preprocess = config[2] if len(config) > 2 else None
+    
+    # Preprocessing returns a new image, and nothing below modifies the shared one
+    processed_image = preprocess_for_magazine(image, preprocess) if preprocess else image
+    
+    # Recognise once for the visual and the text, unless an earlier run already did
+    # for these exact pixels and config. The cache holds no HOCR, so saving it
+    # always recognises afresh
+    image_hash = image_blake2b(processed_image)
+    cache_key = f"tesseract-hocr-{tesseract_config}"
+    entry = None if save_hocr else load_cached_result(image_hash, cache_key)
+    if entry is not None:
+        hocr_output = None
+        words = [tuple(word) for word in entry['words']]
+        float_boxes = [tuple(box) for box in entry['float_boxes']]
+    else:
+        hocr_output, words, float_boxes = recognize(processed_image, tesseract_config, save_hocr)
+        save_cached_result(image_hash, cache_key, {
+            'words': words,
+            'float_boxes': float_boxes
+        })
+    
+    # Save files
+    visual_path = output_dir / f"{image_name}_{i:02d}_{config_name.replace(' ', '_')}_visual.png"
+    hocr_path = None
+    if hocr_output is not None:
+        hocr_path = output_dir / f"{image_name}_{i:02d}_{config_name.replace(' ', '_')}_hocr.html"
+        with open(hocr_path, 'wb') as f:
+            f.write(hocr_output)
+    
+    # Create visual debugging
+    word_count = create_visual_debug(processed_image, words, float_boxes, visual_path)
+    
+    # Extract text
+    text = extract_text_from_hocr_simple(words)
+    
+    return {
+        'name': config_name,
+        'config': tesseract_config,
+        'preprocess': preprocess,
+        'word_count': word_count,
+        'text_length': len(text),
+        'text': text,
+        'visual_path': visual_path,
+        'hocr_path': hocr_path,
+        'has_private': 'PRIVATE' in text.upper(),
+        'has_eye': 'EYE' in text.upper(),
+        'has_andrew': 'ANDREW' in text.upper(),
+        'has_1642': '1642' in text,
+    }
+
+
 def preprocess_for_magazine(image: Image.Image, method: str) -> Image.Image:
     """Apply magazine-specific preprocessing."""
     
@@ -120,91 +229,64 @@ def preprocess_for_magazine(image: Image.Image, method: str) -> Image.Image:
     elif method == "large_text":
         # Optimize for large text (headlines, mastheads)
         image = ImageOps.grayscale(image)
-        # Slight blur to connect broken letters
-        image = image.resize((image.width // 2, image.height // 2), Image.Resampling.LANCZOS)
-        image = image.resize((image.width * 2, image.height * 2), Image.Resampling.LANCZOS)
-        return image
+        # Slight blur to connect broken letters, in one pass rather than a
+        # half-size-and-back round trip (which also kept the page its own size)
+        return Image.fromarray(cv2.GaussianBlur(np.asarray(image), (5, 5), 1.5))
     
     return image
 
 
-def create_visual_debug(image: Image.Image, hocr_path: Path, visual_path: Path) -> int:
+def parse_hocr(hocr_bytes: bytes):
+    """Parse HOCR into (x0, y0, x1, y1, text) word tuples and the boxes of its text floats."""
+    
+    words = []
+    for match in HOCR_WORD_RE.finditer(hocr_bytes):
+        # Words can wrap their text in <strong>/<em>, and entities are escaped
+        text = html.unescape(HTML_TAG_RE.sub(b'', match.group(5)).decode('utf-8')).strip()
+        if text:
+            x0, y0, x1, y1 = map(int, match.group(1, 2, 3, 4))
+            words.append((x0, y0, x1, y1, text))
+    
+    float_boxes = [tuple(map(int, match.groups())) for match in HOCR_TEXTFLOAT_RE.finditer(hocr_bytes)]
+    return words, float_boxes
+
+
+def create_visual_debug(image: Image.Image, words, float_boxes, visual_path: Path) -> int:
     """Create visual debugging image with larger, more visible boxes."""
     
     try:
-        draw = ImageDraw.Draw(image)
-        word_count = 0
-        
-        # Try to load a larger font
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-        except:
-            try:
-                font = ImageFont.load_default()
-            except:
-                font = None
-        
-        # Parse HOCR
-        with open(hocr_path, 'r', encoding='utf-8') as f:
-            hocr_content = f.read()
+        # Draw every box in one OpenCV pass over an RGB copy; the input image is left untouched
+        canvas = np.array(image.convert('RGB'))
+        for x0, y0, x1, y1, _ in words:
+            # Draw thicker, more visible box
+            cv2.rectangle(canvas, (x0, y0), (x1, y1), (255, 0, 0), 3)
+        # Also draw line-level boxes for better visibility
+        for x0, y0, x1, y1 in float_boxes:
+            cv2.rectangle(canvas, (x0, y0), (x1, y1), (0, 0, 255), 2)
         
-        soup = BeautifulSoup(hocr_content, 'html.parser')
-        
-        # Draw boxes for words
-        for span in soup.find_all('span', class_='ocrx_word'):
-            if 'title' in span.attrs:
-                title = span['title']
-                bbox_part = [part for part in title.split(';') if 'bbox' in part][0]
-                coords = list(map(int, bbox_part.split()[1:5]))
-                text = span.get_text().strip()
-                
-                if text:
-                    # Draw thicker, more visible box
-                    draw.rectangle(coords, outline='red', width=3)
-                    # Draw text with background for better visibility
-                    if font:
-                        text_bbox = draw.textbbox((coords[0], coords[1] - 20), text, font=font)
-                        draw.rectangle(text_bbox, fill='yellow', outline='red')
-                        draw.text((coords[0], coords[1] - 20), text, fill='black', font=font)
-                    word_count += 1
+        image = Image.fromarray(canvas)
+        draw = ImageDraw.Draw(image)
         
-        # Also try to draw line-level boxes for better visibility
-        for span in soup.find_all('span', class_='ocrx_textfloat'):
-            if 'title' in span.attrs:
-                title = span['title']
-                bbox_part = [part for part in title.split(';') if 'bbox' in part][0]
-                coords = list(map(int, bbox_part.split()[1:5]))
-                draw.rectangle(coords, outline='blue', width=2)
+        # Draw text with background for better visibility, on top of all the boxes
+        if LABEL_FONT:
+            for x0, y0, x1, y1, text in words:
+                text_bbox = draw.textbbox((x0, y0 - 20), text, font=LABEL_FONT)
+                draw.rectangle(text_bbox, fill='yellow', outline='red')
+                draw.text((x0, y0 - 20), text, fill='black', font=LABEL_FONT)
         
         image.save(visual_path)
-        return word_count
+        return len(words)
         
     except Exception as e:
         print(f"Error creating visual debug: {e}")
         return 0
 
 
-def extract_text_from_hocr_simple(hocr_path: Path) -> str:
-    """Simple text extraction from HOCR."""
+def extract_text_from_hocr_simple(words) -> str:
+    """Simple text extraction from parsed HOCR words."""
     
-    try:
-        with open(hocr_path, 'r', encoding='utf-8') as f:
-            hocr_content = f.read()
-        
-        soup = BeautifulSoup(hocr_content, 'html.parser')
-        
-        # Extract all text, preserve some structure
-        words = []
-        for span in soup.find_all('span', class_='ocrx_word'):
-            text = span.get_text().strip()
-            if text:
-                words.append(text)
-        
-        return ' '.join(words)
-        
-    except Exception as e:
-        print(f"Error extracting text: {e}")
-        return ""
+    # Extract all text, preserve some structure
+    return ' '.join(word[4] for word in words)
 
 
 def analyze_results(results):
@@ -260,17 +342,18 @@ def open_best_results(results):
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python magazine_diagnostic.py <image_path>")
+    args = [arg for arg in sys.argv[1:] if arg != '--save-hocr']
+    if not args:
+        print("Usage: python magazine_diagnostic.py <image_path> [--save-hocr]")
         return
     
-    image_path = sys.argv[1]
+    image_path = args[0]
     if not Path(image_path).exists():
         print(f"Image not found: {image_path}")
         return
     
     print("Starting magazine-specific OCR diagnostic...")
-    results = test_magazine_specific_configs(image_path)
+    results = test_magazine_specific_configs(image_path, save_hocr='--save-hocr' in sys.argv[1:])
     
     if results:
         analyzed_results = analyze_results(results)
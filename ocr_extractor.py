@@ -4,17 +4,57 @@ OCR extractor with bounding box coordinates for PrivateEye magazine archiving.
 Extracts text and creates clickable regions for web interface.
 """
 
+import argparse
+import functools
 import json
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, Set, Tuple
 
 import pytesseract
 from PIL import Image, ImageOps, ImageFilter, ImageEnhance
+import cv2
+import numpy as np
 import pandas as pd
 
+try:
+    # tesserocr keeps the model loaded between configs and pages; optional
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
+# Each tesseract process spawns up to 4 OpenMP threads by default; pin it to one
+# so the pages we OCR side by side don't oversubscribe the CPU
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
 IMG_EXTS = {".png", ".jpg", ".jpeg", ".tiff", ".bmp", ".gif"}
 
+# Columns of Tesseract's TSV output, as pytesseract names them
+TSV_COLUMNS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+               'left', 'top', 'width', 'height', 'conf', 'text')
+
+# Fields kept for each word in the saved OCR data
+WORD_FIELDS = ('text', 'confidence', 'left', 'top', 'width', 'height', 'level',
+               'page_num', 'block_num', 'par_num', 'line_num', 'word_num')
+
+# Words made up only of these are treated as OCR noise
+PUNCTUATION = frozenset('!@#$%^&*()_+=[]{}|\\:";\'<>?,./')
+
+# tesserocr APIs aren't thread-safe, so each thread gets its own (one per language)
+tesseract_apis = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def threshold_table(level: int) -> list:
+    """Lookup table for Image.point: white above the gray level, black at or below it.
+    
+    Built once per level, so Pillow doesn't call a Python lambda 256 times per image.
+    """
+    return [255 if p > level else 0 for p in range(256)]
+
 
 def preprocess_image(
     img: Image.Image,
@@ -25,21 +65,21 @@ def preprocess_image(
     denoise: bool = True,
 ) -> Image.Image:
     """Preprocess image for better OCR results."""
-    # Convert to grayscale first for consistent processing
-    if grayscale:
+    # Convert to grayscale first for consistent processing (unless the caller already has)
+    if grayscale and img.mode != 'L':
         img = ImageOps.grayscale(img)
     
     # Enhance contrast before other operations
     if contrast is not None:
         img = ImageEnhance.Contrast(img).enhance(contrast)
     
-    # Apply noise reduction
+    # Apply noise reduction; OpenCV's 3x3 median matches Pillow's (edges replicated) but is vectorised
     if denoise:
-        img = img.filter(ImageFilter.MedianFilter(size=3))
+        img = Image.fromarray(cv2.medianBlur(np.asarray(img), 3))
     
     # Apply threshold for better text separation
     if threshold is not None:
-        img = img.point(lambda p: 255 if p > threshold else 0)
+        img = img.point(threshold_table(threshold))
     
     # Optional sharpening (can sometimes hurt OCR)
     if sharpen:
@@ -48,15 +88,90 @@ def preprocess_image(
     return img
 
 
+def get_tesseract_api(lang: str):
+    """This thread's tesserocr API for a language, created (and its model loaded) on first use."""
+    if not hasattr(tesseract_apis, 'by_lang'):
+        tesseract_apis.by_lang = {}
+    if lang not in tesseract_apis.by_lang:
+        tesseract_apis.by_lang[lang] = PyTessBaseAPI(lang=lang)
+    return tesseract_apis.by_lang[lang]
+
+
+def text_from_data(data: Dict) -> str:
+    """Rebuild the page text from image_to_data words, in Tesseract's reading order.
+    
+    Words on a line are joined with spaces, lines with a newline and paragraphs
+    (or blocks) with a blank line, close enough to image_to_string for search.
+    """
+    paragraphs = []
+    lines = []
+    line = []
+    current_par = current_line = None
+    for i, text in enumerate(data['text']):
+        # Only level 5 rows are words; the others describe the page, blocks, paragraphs and lines
+        if data['level'][i] != 5:
+            continue
+        par = (data['page_num'][i], data['block_num'][i], data['par_num'][i])
+        if par != current_par or data['line_num'][i] != current_line:
+            if line:
+                lines.append(' '.join(line))
+                line = []
+            if par != current_par and lines:
+                paragraphs.append('\n'.join(lines))
+                lines = []
+            current_par, current_line = par, data['line_num'][i]
+        if text.strip():
+            line.append(text.strip())
+    if line:
+        lines.append(' '.join(line))
+    if lines:
+        paragraphs.append('\n'.join(lines))
+    return '\n\n'.join(paragraphs)
+
+
+def ocr_data_and_text(img: Image.Image, lang: str, psm: int) -> Tuple[Dict, str]:
+    """OCR an image, returning word data in pytesseract's image_to_data dict form and the full text."""
+    config = f"--psm {psm} --oem 3"
+    if PyTessBaseAPI is None:
+        # A second image_to_string call would run tesseract over the page again
+        data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        return data, text_from_data(data)
+    
+    # One recognition serves both the TSV and the text
+    api = get_tesseract_api(lang)
+    api.SetImage(img)
+    api.SetPageSegMode(psm)
+    data = {column: [] for column in TSV_COLUMNS}
+    for row in api.GetTSVText(0).splitlines():
+        fields = row.split('\t', len(TSV_COLUMNS) - 1)
+        for column, value in zip(TSV_COLUMNS[:-2], fields):
+            data[column].append(int(value))
+        data['conf'].append(float(fields[10]))
+        data['text'].append(fields[11] if len(fields) > 11 else '')
+    return data, api.GetUTF8Text()
+
+
 def extract_text_with_boxes(
     image_path: Path,
     lang: str = "eng",
     psm: int = 3,
-    preprocess: bool = True
+    preprocess: bool = True,
+    max_dim: int = 3000
 ) -> Dict:
-    """Extract text with bounding box coordinates from image."""
-    img = Image.open(image_path)
-    original_img = img.copy()
+    """Extract text with bounding box coordinates from image.
+    
+    Pages whose longest side exceeds max_dim (None for no limit) are OCRed
+    downscaled; word boxes are still given in the original image's pixels.
+    """
+    # Preprocessing never modifies its input, so the opened image is used as it is
+    original_img = Image.open(image_path)
+    
+    # Tesseract's run time grows faster than the page area, and scans well past
+    # 300 DPI gain nothing from the extra pixels
+    ocr_img = original_img
+    if max_dim and max(original_img.size) > max_dim:
+        ocr_img = ImageOps.contain(original_img, (max_dim, max_dim), Image.Resampling.LANCZOS)
+    scale = original_img.width / ocr_img.width
     
     # Try multiple preprocessing approaches
     preprocessing_configs = [
@@ -71,48 +186,32 @@ def extract_text_with_boxes(
     best_result = None
     best_word_count = 0
     
+    # The configs all start from grayscale, so convert once for all of them
+    gray_img = ImageOps.grayscale(ocr_img)
+    
     for config in preprocessing_configs:
         try:
-            processed_img = preprocess_image(original_img.copy(), **config) if preprocess else original_img
+            source_img = gray_img if config['grayscale'] else ocr_img
+            processed_img = preprocess_image(source_img, **config) if preprocess else ocr_img
             
-            # Use optimal OCR configuration based on diagnostic results
-            ocr_config = "--psm 3 --oem 3"
+            # Get detailed OCR data with bounding boxes, plus full text for search/indexing,
+            # using the optimal OCR configuration based on diagnostic results
+            data, full_text = ocr_data_and_text(processed_img, lang, psm)
             
-            # Get detailed OCR data with bounding boxes
-            data = pytesseract.image_to_data(
-                processed_img, 
-                lang=lang, 
-                config=ocr_config,
-                output_type=pytesseract.Output.DICT
-            )
+            # Filter out empty text and low confidence results over whole columns at once
+            # A page with no words would otherwise give a float 'text' column with no .str
+            df = pd.DataFrame(data).astype({'text': str})
+            df['text'] = df['text'].str.strip()
+            df['confidence'] = df.pop('conf').astype(float).astype(int)
+            # Boxes go back to the original image's pixels
+            for column in ('left', 'top', 'width', 'height'):
+                df[column] = (df[column] * scale).round().astype(int)
             
-            # Filter out empty text and low confidence results
-            words = []
-            for i in range(len(data['text'])):
-                text = data['text'][i].strip()
-                conf = int(data['conf'][i])
-                
-                # More strict filtering
-                if text and len(text) > 0 and conf > 50:
-                    # Filter out likely OCR errors
-                    if not all(c in '!@#$%^&*()_+=[]{}|\\:";\'<>?,./' for c in text):
-                        words.append({
-                            'text': text,
-                            'confidence': conf,
-                            'left': data['left'][i],
-                            'top': data['top'][i],
-                            'width': data['width'][i],
-                            'height': data['height'][i],
-                            'level': data['level'][i],
-                            'page_num': data['page_num'][i],
-                            'block_num': data['block_num'][i],
-                            'par_num': data['par_num'][i],
-                            'line_num': data['line_num'][i],
-                            'word_num': data['word_num'][i]
-                        })
-            
-            # Get full text for search/indexing
-            full_text = pytesseract.image_to_string(processed_img, lang=lang, config=ocr_config)
+            # More strict filtering
+            df = df[(df['text'].str.len() > 0) & (df['confidence'] > 50)]
+            # Filter out likely OCR errors
+            df = df[~df['text'].map(PUNCTUATION.issuperset).astype(bool)]
+            words = df[list(WORD_FIELDS)].to_dict('records')
             
             result = {
                 'source': str(image_path),
@@ -144,33 +243,76 @@ def extract_text_with_boxes(
     }
 
 
-def process_magazine_pages(input_dir: Path = None) -> List[Dict]:
-    """Process all PNG files in directory and extract OCR data."""
+def process_magazine_pages(input_dir: Path = None, max_dim: int = 3000, skip_sources: Set[str] = frozenset()) -> Iterator[Dict]:
+    """Process all PNG files in directory, yielding each page's OCR data in filename order.
+    
+    Pages whose source is in skip_sources (already extracted) are left out.
+    """
     if input_dir is None:
         input_dir = Path(".")
     
-    png_files = list(input_dir.glob("*.png"))
-    results = []
+    png_files = [png_file for png_file in input_dir.glob("*.png") if str(png_file) not in skip_sources]
     
-    for png_file in sorted(png_files):
+    def process_page(png_file):
         try:
             print(f"Processing {png_file.name}...", file=sys.stderr)
-            ocr_data = extract_text_with_boxes(png_file)
-            results.append(ocr_data)
+            return extract_text_with_boxes(png_file, max_dim=max_dim)
         except Exception as e:
             print(f"Error processing {png_file}: {e}", file=sys.stderr)
+            return None
     
-    return results
+    # Tesseract releases the GIL (or runs in its own subprocess), so threads OCR the pages in parallel.
+    # Pages are handed on as they finish, so only the ones not yet written are held in memory
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for ocr_data in executor.map(process_page, sorted(png_files)):
+            if ocr_data is not None:
+                yield ocr_data
 
 
-def save_ocr_data(ocr_results: List[Dict], output_file: Path = Path("magazine_ocr.json")):
-    """Save OCR results to JSON file."""
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(ocr_results, f, indent=2, ensure_ascii=False)
-    print(f"Saved OCR data to {output_file}")
+def load_saved_sources(output_file: Path = Path("magazine_ocr.jsonl")) -> Set[str]:
+    """Sources of the pages already saved to a JSON Lines file."""
+    sources = set()
+    try:
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    sources.add(json.loads(line)['source'])
+                except (ValueError, KeyError):
+                    # A run killed mid-write leaves a partial last line; that page is redone
+                    continue
+    except FileNotFoundError:
+        pass
+    return sources
+
+
+def save_ocr_data(ocr_results: Iterable[Dict], output_file: Path = Path("magazine_ocr.jsonl")):
+    """Append OCR results to a JSON Lines file, one page per line, as they arrive."""
+    # Start on a fresh line if an interrupted run left a partial one
+    partial_line = False
+    if output_file.exists() and output_file.stat().st_size:
+        with open(output_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            partial_line = f.read(1) != b'\n'
+    
+    count = 0
+    with open(output_file, 'a', encoding='utf-8') as f:
+        if partial_line:
+            f.write('\n')
+        for ocr_data in ocr_results:
+            f.write(json.dumps(ocr_data, ensure_ascii=False) + '\n')
+            # Flush each page so an interrupted run keeps everything finished so far
+            f.flush()
+            count += 1
+    print(f"Saved OCR data for {count} pages to {output_file}")
 
 
 if __name__ == "__main__":
-    # Process all PNG files in current directory
-    ocr_results = process_magazine_pages()
-    save_ocr_data(ocr_results)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Extract OCR text and word boxes from magazine pages")
+    parser.add_argument("--max-dim", type=int, default=3000,
+                        help="Downscale pages whose longest side exceeds this many pixels before OCR (0 to disable)")
+    args = parser.parse_args()
+    
+    # Process all PNG files in current directory, resuming after any already saved
+    output_file = Path("magazine_ocr.jsonl")
+    ocr_results = process_magazine_pages(max_dim=args.max_dim, skip_sources=load_saved_sources(output_file))
+    save_ocr_data(ocr_results, output_file)
\ No newline at end of file
@@ -3,44 +3,62 @@
 Interactive OpenAI Vision viewer with overlay text that can be toggled and copy/pasted.
 """
 
+import asyncio
 import base64
+import httpx
+import io
 import json
 from pathlib import Path
 import openai
+import orjson
 import os
 import sys
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, send_from_directory
+from PIL import Image
 import re
+import time
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
+try:
+    # Lets httpx multiplex concurrent requests over one HTTP/2 connection; optional
+    import h2
+except ImportError:
+    h2 = None
 
-app = Flask(__name__)
+from result_cache import file_sha256, load_cached_bytes, save_cached_bytes
 
-# Global storage for processed images
-processed_images = {}
+# Most OpenAI Vision requests allowed in flight at once
+MAX_CONCURRENT_VISION_REQUESTS = 5
 
+# Longest single wait between retries of a failed request, in seconds
+MAX_RETRY_WAIT = 16
 
-def setup_openai():
-    """Setup OpenAI client with API key."""
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        print("❌ OPENAI_API_KEY environment variable not set")
-        return None
-    return openai.OpenAI(api_key=api_key)
+# Longest edge, in pixels, of the images sent to GPT-4o. High detail shrinks a page
+# to 768px on its short side anyway, so a portrait scan loses almost nothing
+MAX_IMAGE_EDGE = 1024
 
+# Parses the JSON array out of a Vision reply in place, wherever it starts
+JSON_DECODER = json.JSONDecoder()
 
-def encode_image(image_path):
-    """Encode image to base64 for OpenAI API."""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+# Quoted strings, for the manual fallback
+QUOTED_TEXT_RE = re.compile(r'"([^"\n]+)"')
 
+# Results by image name, one JSON record per line so each new image is a single append
+CACHE_FILE = Path("openai_cache.jsonl")
 
-def extract_text_with_openai(client, image_path):
-    """Extract text using OpenAI Vision with position estimation."""
-    
-    try:
-        base64_image = encode_image(image_path)
-        
-        prompt = """Analyze this image and extract ALL visible text with approximate positions.
+# Earlier versions rewrote the whole cache as one JSON object
+LEGACY_CACHE_FILE = Path("openai_cache.json")
+
+# Seconds before a cached result is fetched again even if its image is unchanged (0 = never)
+CACHE_TTL = float(os.getenv('CACHE_TTL', 0))
+
+# Batch API jobs submitted by an earlier run and not yet collected
+BATCH_FILE = Path("openai_batches.json")
+
+# Request file uploaded for a new batch, removed once it's sent
+BATCH_INPUT_FILE = Path("openai_viewer_batch.jsonl")
+
+VISION_PROMPT = """Analyze this image and extract ALL visible text with approximate positions.
 
 For each piece of text you find, provide:
 1. The exact text content
@@ -74,127 +92,451 @@ Be very thorough - extract ALL text including:
 
 Estimate positions as accurately as possible by looking at where the text appears relative to the image boundaries."""
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}",
-                                "detail": "high"
-                            }
+
+app = Flask(__name__)
+
+# Seconds the browser may reuse a served page image without asking again
+IMAGE_MAX_AGE = 24 * 60 * 60
+
+# Global storage for processed images
+processed_images = {}
+
+
+def setup_openai():
+    """Setup OpenAI client with API key."""
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        print("❌ OPENAI_API_KEY environment variable not set")
+        return None
+    # Keep a connection alive for each request allowed in flight, so later requests
+    # reuse it instead of doing a new TLS handshake
+    http_client = httpx.AsyncClient(
+        http2=h2 is not None,
+        timeout=openai.DEFAULT_TIMEOUT,
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_VISION_REQUESTS,
+                            max_keepalive_connections=MAX_CONCURRENT_VISION_REQUESTS)
+    )
+    # Retries are handled by create_vision_completion
+    return openai.AsyncOpenAI(api_key=api_key, max_retries=0, http_client=http_client)
+
+
+def encode_image(image_path, max_edge=MAX_IMAGE_EDGE):
+    """Encode image as a base64 data URL for OpenAI API.
+    
+    Images larger than max_edge (None or 0 for no limit) are downscaled and
+    re-encoded as JPEG. The JPEG is cached on disk by image content and
+    max_edge, so later requests and runs skip the resize and encode.
+    """
+    # Opening only reads the header, enough to tell whether a resize is needed
+    with Image.open(image_path) as image:
+        if max_edge and max(image.size) > max_edge:
+            image_hash = file_sha256(image_path)
+            cache_key = f"jpeg-q85-max{max_edge}"
+            jpeg = load_cached_bytes(image_hash, cache_key)
+            if jpeg is None:
+                image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                image.convert("RGB").save(buffer, "JPEG", quality=85)
+                jpeg = buffer.getvalue()
+                save_cached_bytes(image_hash, cache_key, jpeg)
+            return data_url("image/jpeg", jpeg)
+    
+    return data_url("image/png", Path(image_path).read_bytes())
+
+
+def data_url(media_type, data):
+    """The data: URL for some image bytes.
+    
+    The URL is the only copy kept; building it from the encoded bytes, rather
+    than formatting a base64 string into it, leaves no second string behind.
+    """
+    return (f"data:{media_type};base64,".encode('ascii') + base64.b64encode(data)).decode('ascii')
+
+
+def is_retryable(error):
+    """True for rate limits, connection failures and transient server errors."""
+    return isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def report_retry(retry_state):
+    """Let the user know a transient failure is being retried."""
+    error = retry_state.outcome.exception()
+    print(f"⏳ {type(error).__name__}, retrying in {retry_state.next_action.sleep:.1f}s...")
+
+
+@retry(
+    retry=retry_if_exception(is_retryable),
+    wait=wait_exponential(multiplier=1, min=1, max=MAX_RETRY_WAIT),
+    stop=stop_after_attempt(3),
+    before_sleep=report_retry,
+    reraise=True
+)
+async def create_vision_completion(client, **params):
+    """Send one chat completion request, retrying rate limits and transient errors."""
+    return await client.chat.completions.create(**params)
+
+
+def vision_request(image_url):
+    """Chat completion parameters for extracting positioned text from one image."""
+    return {
+        "model": "gpt-4o",
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": VISION_PROMPT},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url,
+                            "detail": "high"
                         }
-                    ]
-                }
-            ],
-            max_tokens=1500
-        )
-        
-        response_text = response.choices[0].message.content
-        
-        # Try to extract JSON from response
-        try:
-            # Look for JSON array in the response
-            json_match = re.search(r'\[.*?\]', response_text, re.DOTALL)
-            if json_match:
-                json_text = json_match.group(0)
-                extracted_data = json.loads(json_text)
-                return extracted_data
-            else:
-                # Fallback: try to parse the whole response as JSON
-                return json.loads(response_text)
-                
-        except json.JSONDecodeError:
-            print("Could not parse as JSON, trying to extract manually...")
-            # Manual fallback - look for text patterns
-            return parse_text_manually(response_text)
+                    }
+                ]
+            }
+        ],
+        "max_tokens": 1500
+    }
+
+
+def parse_vision_response(response_text):
+    """Turn GPT-4o's reply into a list of text elements."""
+    # Try to extract JSON from response, decoding from the first '[' to the end of
+    # that array, so brackets nested inside it don't cut it short
+    try:
+        start = response_text.find('[')
+        if start >= 0:
+            extracted_data, _ = JSON_DECODER.raw_decode(response_text, start)
+            return extracted_data
+        else:
+            # Fallback: try to parse the whole response as JSON
+            return orjson.loads(response_text)
+            
+    # orjson's decode error subclasses this one
+    except json.JSONDecodeError:
+        print("Could not parse as JSON, trying to extract manually...")
+        # Manual fallback - look for text patterns
+        return parse_text_manually(response_text)
+
+
+async def extract_text_with_openai(client, image_path, max_edge=MAX_IMAGE_EDGE):
+    """Extract text using OpenAI Vision with position estimation."""
+    
+    try:
+        # Reading and encoding a multi-megabyte scan would otherwise stall the other requests
+        image_url = await asyncio.to_thread(encode_image, image_path, max_edge)
+        response = await create_vision_completion(client, **vision_request(image_url))
+        return parse_vision_response(response.choices[0].message.content)
             
     except Exception as e:
         print(f"Error calling OpenAI: {e}")
         return []
 
 
+def load_pending_batches():
+    """Load {batch_id: [image_path, ...]} for Batch API jobs not yet collected."""
+    if BATCH_FILE.exists():
+        try:
+            return orjson.loads(BATCH_FILE.read_bytes())
+        except Exception as e:
+            print(f"Error loading pending batches: {e}")
+    return {}
+
+
+def save_pending_batches(pending):
+    """Save the Batch API jobs still waiting to be collected."""
+    try:
+        BATCH_FILE.write_bytes(orjson.dumps(pending, option=orjson.OPT_INDENT_2))
+    except Exception as e:
+        print(f"Error saving pending batches: {e}")
+
+
+async def submit_batch(image_paths, max_edge=MAX_IMAGE_EDGE):
+    """Submit images to the OpenAI Batch API; results are collected on a later run.
+    
+    Batch requests cost half as much as individual calls but can take up to
+    24 hours, so this only records the batch ID rather than waiting on it.
+    """
+    client = setup_openai()
+    if not client:
+        return None
+    
+    try:
+        # Write the requests out one at a time and upload from the file, so only
+        # one image's encoding is being built at once, not the whole batch
+        with open(BATCH_INPUT_FILE, 'wb') as f:
+            for image_path in image_paths:
+                f.write(orjson.dumps({
+                    "custom_id": str(image_path),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": vision_request(encode_image(image_path, max_edge))
+                }) + b"\n")
+        
+        with open(BATCH_INPUT_FILE, 'rb') as f:
+            batch_input = await client.files.create(file=f, purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=batch_input.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        
+        pending = load_pending_batches()
+        pending[batch.id] = [str(image_path) for image_path in image_paths]
+        save_pending_batches(pending)
+        print(f"Submitted {len(image_paths)} images as batch {batch.id}; run again later to collect results")
+        return batch.id
+        
+    except Exception as e:
+        print(f"Error submitting OpenAI batch: {e}")
+        return None
+    finally:
+        BATCH_INPUT_FILE.unlink(missing_ok=True)
+        await client.close()
+
+
+async def collect_batch_results():
+    """Store results from finished Batch API jobs, returning how many images were collected."""
+    pending = load_pending_batches()
+    if not pending:
+        return 0
+    
+    client = setup_openai()
+    if not client:
+        return 0
+    
+    collected = 0
+    try:
+        for batch_id, image_paths in list(pending.items()):
+            try:
+                batch = await client.batches.retrieve(batch_id)
+                if batch.status in ('failed', 'expired', 'cancelled'):
+                    print(f"Batch {batch_id} {batch.status}; its images will be processed again")
+                    del pending[batch_id]
+                    continue
+                if batch.status != 'completed':
+                    print(f"Batch {batch_id} still {batch.status}")
+                    continue
+                
+                output = await client.files.content(batch.output_file_id) if batch.output_file_id else None
+                for line in (output.text.splitlines() if output else []):
+                    entry = orjson.loads(line)
+                    image_path = entry['custom_id']
+                    response = entry.get('response') or {}
+                    if response.get('status_code') != 200:
+                        print(f"Batch request failed for {Path(image_path).name}")
+                        continue
+                    store_result(image_path, parse_vision_response(response['body']['choices'][0]['message']['content']))
+                    collected += 1
+                del pending[batch_id]
+                
+            except Exception as e:
+                print(f"Error collecting batch {batch_id}: {e}")
+    finally:
+        await client.close()
+        save_pending_batches(pending)
+    
+    if collected:
+        print(f"Collected {collected} results from the OpenAI Batch API")
+    return collected
+
+
 def parse_text_manually(response_text):
     """Manual parsing fallback if JSON parsing fails."""
     # Simple fallback - extract quoted text and make rough position estimates
-    import re
-    
-    lines = response_text.split('\n')
     results = []
     
-    for line in lines:
-        # Look for quoted text
-        quotes = re.findall(r'"([^"]+)"', line)
-        for quote in quotes:
-            if len(quote) > 2:  # Skip very short matches
-                results.append({
-                    "text": quote,
-                    "x_percent": 50,  # Default to center
-                    "y_percent": 30 + len(results) * 15,  # Spread vertically
-                    "size": "medium",
-                    "type": "other"
-                })
+    # Look for quoted text in one pass; quotes never span lines, as if matched line by line
+    for quote in QUOTED_TEXT_RE.findall(response_text):
+        if len(quote) > 2:  # Skip very short matches
+            results.append({
+                "text": quote,
+                "x_percent": 50,  # Default to center
+                "y_percent": 30 + len(results) * 15,  # Spread vertically
+                "size": "medium",
+                "type": "other"
+            })
     
     return results
 
 
 def load_cached_results():
-    """Load previously processed results from cache file."""
-    cache_file = Path("openai_cache.json")
-    if cache_file.exists():
+    """Load previously processed results from cache file.
+    
+    Each line is one {"n": image_name, "d": result} record; later lines
+    replace earlier ones for the same image.
+    """
+    if not CACHE_FILE.exists() and LEGACY_CACHE_FILE.exists():
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-                processed_images.update(cached_data)
-                print(f"Loaded {len(cached_data)} cached results from {cache_file}")
-                return True
+            cached_data = orjson.loads(LEGACY_CACHE_FILE.read_bytes())
+            processed_images.update(cached_data)
+            print(f"Loaded {len(cached_data)} cached results from {LEGACY_CACHE_FILE}")
+            # Carry them over, since new results are only appended to the new file
+            save_cached_results()
+            return True
+        except Exception as e:
+            print(f"Error loading cache: {e}")
+    
+    if CACHE_FILE.exists():
+        try:
+            damaged = False
+            with open(CACHE_FILE, 'rb') as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # A run killed mid-write leaves a partial last line
+                        damaged = True
+                        continue
+                    processed_images[record['n']] = record['d']
+            print(f"Loaded {len(processed_images)} cached results from {CACHE_FILE}")
+            if damaged:
+                # Rewrite without it, so the next append starts on a line of its own
+                save_cached_results()
+            return True
         except Exception as e:
             print(f"Error loading cache: {e}")
     return False
 
 
+def append_cache_entry(image_name, result):
+    """Add one image's result to the end of the cache file."""
+    try:
+        with open(CACHE_FILE, 'ab') as f:
+            f.write(orjson.dumps({'n': image_name, 'd': result}) + b"\n")
+    except Exception as e:
+        print(f"Error saving cache: {e}")
+
+
 def save_cached_results():
-    """Save processed results to cache file."""
-    cache_file = Path("openai_cache.json")
+    """Compact the cache file down to one line per image."""
+    tmp_file = CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
     try:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(processed_images, f, indent=2, ensure_ascii=False)
-        print(f"Saved {len(processed_images)} results to {cache_file}")
+        with open(tmp_file, 'wb') as f:
+            for image_name, result in processed_images.items():
+                f.write(orjson.dumps({'n': image_name, 'd': result}) + b"\n")
+        # Swap it in whole, so an interrupted compaction loses nothing
+        os.replace(tmp_file, CACHE_FILE)
+        print(f"Saved {len(processed_images)} results to {CACHE_FILE}")
     except Exception as e:
         print(f"Error saving cache: {e}")
 
 
-def process_image(image_path, force_reprocess=False):
-    """Process image with OpenAI and store results."""
+def file_stamp(image_path):
+    """What a cached result records about its image, to notice the file changing."""
+    stat = os.stat(image_path)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': file_sha256(image_path)}
+
+
+def cached_result(image_path):
+    """The cached result for an image, or None if there isn't one or the image has changed since.
+    
+    An unchanged mtime and size is trusted; otherwise the contents are hashed,
+    so a file that was only touched keeps its result.
+    """
+    image_name = Path(image_path).name
+    entry = processed_images.get(image_name)
+    if entry is None:
+        return None
+    if CACHE_TTL and time.time() - entry.get('cached_at', 0) > CACHE_TTL:
+        return None
+    
+    try:
+        stat = os.stat(image_path)
+    except FileNotFoundError:
+        # Nothing to compare against (or to reprocess)
+        return entry
+    
+    if 'sha256' not in entry:
+        # Cached before images were stamped; trust it and stamp it now
+        entry.update(file_stamp(image_path))
+        append_cache_entry(image_name, entry)
+        return entry
+    if entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+        return entry
+    if entry['sha256'] == file_sha256(image_path):
+        entry['mtime'] = stat.st_mtime
+        append_cache_entry(image_name, entry)
+        return entry
+    return None
+
+
+def store_result(image_path, text_data, stamp=None):
+    """Record an image's result and append it to the cache straight away."""
+    image_name = Path(image_path).name
+    processed_images[image_name] = {
+        'image_path': image_path,
+        'text_data': text_data,
+        'total_texts': len(text_data),
+        'cached_at': time.time(),
+        **(stamp or file_stamp(image_path))
+    }
+    append_cache_entry(image_name, processed_images[image_name])
+    return processed_images[image_name]
+
+
+async def process_image(image_path, force_reprocess=False, client=None, semaphore=None, max_edge=MAX_IMAGE_EDGE):
+    """Process image with OpenAI and store results.
+    
+    The semaphore caps how many OpenAI requests are in flight at once.
+    """
     
     image_name = Path(image_path).name
     
-    # Check if already processed (unless forced)
-    if not force_reprocess and image_name in processed_images:
+    # Check if already processed, from this exact image (unless forced)
+    cached = None if force_reprocess else await asyncio.to_thread(cached_result, image_path)
+    if cached:
         print(f"Using cached result for {image_name}")
-        return processed_images[image_name]
+        return cached
     
-    client = setup_openai()
     if not client:
         return None
     
-    print(f"Processing {image_path} with OpenAI Vision...")
+    # Stamp the file as it was sent, so a change made mid-request is noticed next run
+    stamp = await asyncio.to_thread(file_stamp, image_path)
     
     # Extract text with positions
-    text_data = extract_text_with_openai(client, image_path)
+    async with semaphore:
+        print(f"Processing {image_path} with OpenAI Vision...")
+        text_data = await extract_text_with_openai(client, image_path, max_edge)
     
     # Store results
-    processed_images[image_name] = {
-        'image_path': image_path,
-        'text_data': text_data,
-        'total_texts': len(text_data)
-    }
+    return store_result(image_path, text_data, stamp)
+
+
+async def process_images(image_paths, force_reprocess=False, max_edge=MAX_IMAGE_EDGE):
+    """Process all images concurrently, returning one result (or exception) per path."""
     
-    return processed_images[image_name]
+    client = setup_openai()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_VISION_REQUESTS)
+    try:
+        return await asyncio.gather(*(process_image(str(path), force_reprocess, client, semaphore, max_edge)
+                                      for path in image_paths), return_exceptions=True)
+    finally:
+        if client:
+            await client.close()
+
+
+def half_percent(value):
+    """A 0-100 position as a whole number of half percents (0-200); anything unreadable is 0."""
+    try:
+        return min(max(round(float(value) * 2), 0), 200)
+    except (TypeError, ValueError):
+        return 0
+
+
+def overlay_columns(text_data):
+    """Lay text elements out as parallel lists for the viewer, so each key is sent once.
+    
+    Positions are whole half percents, which is finer than GPT-4o's estimates.
+    """
+    return {
+        'texts': [item.get('text', '') for item in text_data],
+        'x': [half_percent(item.get('x_percent')) for item in text_data],
+        'y': [half_percent(item.get('y_percent')) for item in text_data],
+        'size': [item.get('size', 'medium') for item in text_data],
+        'type': [item.get('type', 'other') for item in text_data]
+    }
 
 
 @app.route('/')
@@ -213,21 +555,23 @@ def view_image(image_name):
     data = processed_images[image_name]
     return render_template('image_viewer.html', 
                          image_name=image_name,
-                         image_data=data)
+                         image_data=data,
+                         overlays=overlay_columns(data['text_data']))
 
 
 @app.route('/images/<path:filename>')
 def serve_image(filename):
     """Serve image files."""
-    return send_from_directory('.', filename)
+    # Pages don't change once scanned, so let the browser keep them for a day
+    # and revalidate with the ETag/Last-Modified headers after that
+    return send_from_directory('.', filename, conditional=True, max_age=IMAGE_MAX_AGE)
 
 
 @app.route('/api/text_data/<image_name>')
 def get_text_data(image_name):
     """API endpoint to get text data for an image."""
-    if image_name in processed_images:
-        return jsonify(processed_images[image_name]['text_data'])
-    return jsonify([])
+    text_data = processed_images[image_name]['text_data'] if image_name in processed_images else []
+    return Response(orjson.dumps(overlay_columns(text_data)), mimetype='application/json')
 
 
 def create_templates():
@@ -319,6 +663,15 @@ def create_templates():
             max-width: 90vw;
         }
         
+        /* The container spans the page, so the overlays are placed against this
+           frame, which shrinks to the image's own width */
+        .image-frame {
+            position: relative;
+            display: inline-block;
+            max-width: 100%;
+            vertical-align: top;
+        }
+        
         .main-image {
             max-width: 100%;
             height: auto;
@@ -416,8 +769,10 @@ def create_templates():
     </div>
     
     <div class="image-container">
-        <img src="/images/{{ image_name }}" class="main-image" id="mainImage" alt="{{ image_name }}">
-        <div id="textOverlays"></div>
+        <div class="image-frame">
+            <img src="/images/{{ image_name }}" class="main-image" id="mainImage" alt="{{ image_name }}">
+            <div id="textOverlays"></div>
+        </div>
     </div>
     
     <div class="sidebar" id="sidebar">
@@ -427,13 +782,13 @@ def create_templates():
     </div>
 
     <script>
-        const imageData = {{ image_data.text_data | tojson }};
+        // Parallel lists: texts[i] sits at x[i], y[i] half percents of the image
+        const overlays = {{ overlays | tojson }};
         const overlaysContainer = document.getElementById('textOverlays');
         const textList = document.getElementById('textList');
         const toggleBtn = document.getElementById('toggleOverlays');
         const sidebarBtn = document.getElementById('toggleSidebar');
         const sidebar = document.getElementById('sidebar');
-        const mainImage = document.getElementById('mainImage');
         
         let overlaysVisible = true;
         let sidebarVisible = true;
@@ -442,22 +797,21 @@ def create_templates():
             overlaysContainer.innerHTML = '';
             textList.innerHTML = '';
             
-            const imageRect = mainImage.getBoundingClientRect();
-            const containerRect = overlaysContainer.parentElement.getBoundingClientRect();
-            
-            imageData.forEach((item, index) => {
+            for (let index = 0; index < overlays.texts.length; index++) {
+                const text = overlays.texts[index];
+                const size = overlays.size[index];
+                const type = overlays.type[index];
+                
                 // Create overlay element
                 const overlay = document.createElement('div');
-                overlay.className = `text-overlay size-${item.size} type-${item.type}`;
-                overlay.textContent = item.text;
+                overlay.className = `text-overlay size-${size} type-${type}`;
+                overlay.textContent = text;
                 overlay.dataset.index = index;
                 
-                // Position based on percentages
-                const x = (item.x_percent / 100) * mainImage.clientWidth;
-                const y = (item.y_percent / 100) * mainImage.clientHeight;
-                
-                overlay.style.left = x + 'px';
-                overlay.style.top = y + 'px';
+                // Position as percentages of the image frame, which is sized by the image,
+                // so the browser keeps overlays in place as the image scales
+                overlay.style.left = (overlays.x[index] / 2) + '%';
+                overlay.style.top = (overlays.y[index] / 2) + '%';
                 
                 overlay.addEventListener('click', () => selectText(index));
                 overlaysContainer.appendChild(overlay);
@@ -466,13 +820,13 @@ def create_templates():
                 const listItem = document.createElement('li');
                 listItem.className = 'text-item';
                 listItem.innerHTML = `
-                    <strong>${item.text}</strong><br>
-                    <small>${item.type} (${item.size})</small>
+                    <strong>${text}</strong><br>
+                    <small>${type} (${size})</small>
                 `;
                 listItem.dataset.index = index;
                 listItem.addEventListener('click', () => selectText(index));
                 textList.appendChild(listItem);
-            });
+            }
         }
         
         function selectText(index) {
@@ -487,7 +841,7 @@ def create_templates():
                 overlay.classList.add('selected');
                 
                 // Copy text to clipboard
-                const text = imageData[index].text;
+                const text = overlays.texts[index];
                 navigator.clipboard.writeText(text).then(() => {
                     console.log('Copied to clipboard:', text);
                 }).catch(err => {
@@ -517,23 +871,41 @@ def create_templates():
         // Event listeners
         toggleBtn.addEventListener('click', toggleOverlays);
         sidebarBtn.addEventListener('click', toggleSidebar);
-        mainImage.addEventListener('load', createOverlays);
-        window.addEventListener('resize', createOverlays);
         
-        // Initial setup
-        if (mainImage.complete) {
-            createOverlays();
-        }
+        // Initial setup; percentage positions don't need the image loaded or a resize handler
+        createOverlays();
     </script>
 </body>
 </html>'''
     
-    # Write templates with UTF-8 encoding
-    with open(templates_dir / "openai_viewer.html", "w", encoding='utf-8') as f:
-        f.write(index_template)
+    # Write templates with UTF-8 encoding, leaving unchanged ones alone so
+    # the files' mtimes survive a restart
+    for name, template in (("openai_viewer.html", index_template),
+                           ("image_viewer.html", viewer_template)):
+        template_path = templates_dir / name
+        if not template_path.exists() or template_path.read_text(encoding='utf-8') != template:
+            template_path.write_text(template, encoding='utf-8')
+        # Compile it now rather than on the first page view
+        app.jinja_env.get_template(name)
+
+
+def serve_app(debug=False, host='0.0.0.0', port=5000):
+    """Serve the viewer, with waitress's thread pool if it's installed.
+    
+    Flask's own server is a development server, and in debug mode it also
+    runs the reloader and debugger, so it's only used when asked for.
+    """
+    if debug:
+        app.run(debug=True, host=host, port=port)
+        return
     
-    with open(templates_dir / "image_viewer.html", "w", encoding='utf-8') as f:
-        f.write(viewer_template)
+    try:
+        from waitress import serve
+    except ImportError:
+        # pip install waitress for a production server; until then one thread per request
+        app.run(threaded=True, host=host, port=port)
+        return
+    serve(app, host=host, port=port, threads=8)
 
 
 def main():
@@ -543,6 +915,9 @@ def main():
     parser = argparse.ArgumentParser(description='OpenAI Vision Interactive Viewer')
     parser.add_argument('--reprocess', action='store_true', help='Force reprocessing of all images')
     parser.add_argument('--cache-only', action='store_true', help='Only use cached results, no new processing')
+    parser.add_argument('--batch', action='store_true', help='Send images through the OpenAI Batch API (half price, collected on a later run)')
+    parser.add_argument('--debug', action='store_true', help="Run Flask's single-process debug server with the reloader")
+    parser.add_argument('--max-edge', type=int, default=MAX_IMAGE_EDGE, help='Downscale images to this many pixels on their longest edge before upload (0 to send originals)')
     args = parser.parse_args()
     
     # Create templates
@@ -551,6 +926,10 @@ def main():
     # Load cached results first
     load_cached_results()
     
+    # Pick up results from any Batch API jobs that have finished since the last run
+    if not args.cache_only:
+        asyncio.run(collect_batch_results())
+    
     if args.cache_only:
         print("Cache-only mode: using existing cached results")
         if not processed_images:
@@ -578,7 +957,7 @@ def main():
             
             # 1. First image (cover page)
             first_image = png_files[0]
-            if first_image.name not in processed_images:
+            if not cached_result(first_image):
                 images_to_process.append(first_image)
                 print(f"Selected cover page: {first_image.name}")
             else:
@@ -587,25 +966,34 @@ def main():
             # 2. One random image from the rest (if not enough cached)
             if len(processed_images) < 2 and len(png_files) > 1:
                 import random
-                remaining_files = [f for f in png_files[1:] if f.name not in processed_images]
+                remaining_files = [f for f in png_files[1:] if not cached_result(f)]
                 if remaining_files:
                     random_image = random.choice(remaining_files)
                     images_to_process.append(random_image)
                     print(f"Selected random page: {random_image.name}")
         
+        # Images already in a submitted batch wait for it rather than being sent again
+        batched = {image_path for paths in load_pending_batches().values() for image_path in paths}
+        images_to_process = [f for f in images_to_process if str(f) not in batched]
+        
         # Process selected images
-        if images_to_process:
+        if images_to_process and args.batch:
+            print(f"\nSubmitting {len(images_to_process)} images to the OpenAI Batch API...")
+            asyncio.run(submit_batch(images_to_process, args.max_edge))
+        elif images_to_process:
             print(f"\nProcessing {len(images_to_process)} images with OpenAI Vision...")
             
-            for image_path in images_to_process:
-                print(f"\nProcessing {image_path.name}...")
-                result = process_image(str(image_path), force_reprocess=args.reprocess)
-                if result:
-                    print(f"  Success: {result['total_texts']} text elements found")
+            # Each request mostly waits on the network, so send them side by side
+            results = asyncio.run(process_images(images_to_process, force_reprocess=args.reprocess,
+                                                 max_edge=args.max_edge))
+            
+            for image_path, result in zip(images_to_process, results):
+                if result and not isinstance(result, BaseException):
+                    print(f"  {image_path.name}: {result['total_texts']} text elements found")
                 else:
                     print(f"  Failed to process {image_path.name}")
             
-            # Save updated cache
+            # Each result was appended as it arrived; drop the lines they superseded
             save_cached_results()
         else:
             print("All selected images already processed (cached)")
@@ -622,8 +1010,10 @@ def main():
         print(f"\nCommands for next run:")
         print(f"   python openai_interactive_viewer.py --cache-only    (use cached results only)")
         print(f"   python openai_interactive_viewer.py --reprocess     (reprocess all images)")
+        print(f"   python openai_interactive_viewer.py --reprocess --batch  (reprocess via the OpenAI Batch API)")
+        print(f"   python openai_interactive_viewer.py --debug         (Flask debug server with auto-reload)")
         
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        serve_app(debug=args.debug)
     else:
         print("No images available to display")
 
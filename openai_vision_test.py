@@ -12,6 +12,8 @@ import openai
 import os
 import sys
 
+from key_terms import KEY_TERMS, find_key_terms
+
 
 def setup_openai():
     """Setup OpenAI client with API key."""
@@ -140,13 +142,13 @@ def test_tesseract_comparison(image_path):
         ]
         
         tesseract_results = {}
-        all_text_combined = ""
+        text_parts = []
         
         for name, config in configs:
             try:
                 text = pytesseract.image_to_string(image, config=config).strip()
                 tesseract_results[name] = text
-                all_text_combined += " " + text
+                text_parts.append(text)
                 if text:
                     print(f"{name}: {repr(text[:80])}...")
                 else:
@@ -154,10 +156,12 @@ def test_tesseract_comparison(image_path):
             except Exception as e:
                 print(f"{name}: Error - {e}")
         
+        all_text_combined = " ".join(text_parts)
+        
         # Check for key magazine terms
-        key_terms = ['PRIVATE', 'EYE', 'ANDREW', 'DENIES', 'BEING', 'CHINESE', 'SPY', '1642']
-        found_terms = [term for term in key_terms if term in all_text_combined.upper()]
-        missing_terms = [term for term in key_terms if term not in all_text_combined.upper()]
+        key_terms = KEY_TERMS
+        found_terms = find_key_terms(all_text_combined)
+        missing_terms = [term for term in key_terms if term not in found_terms]
         
         print(f"\n✅ Tesseract found: {found_terms}")
         print(f"❌ Tesseract missed: {missing_terms}")
@@ -8,7 +8,6 @@ import pytesseract
 from PIL import Image, ImageDraw, ImageFont
 import sys
 from pathlib import Path
-from bs4 import BeautifulSoup
 import webbrowser
 
 
@@ -59,19 +58,15 @@ def test_psm_with_visual_overlay(image_path: str, use_case: str = "both"):
         try:
             print(f"\nTesting PSM {psm}: {description}")
             
-            # Generate HOCR output
+            # Get word boxes as a table straight from Tesseract's TSV, no HOCR to parse
             image = Image.open(image_path)
             config = f"--psm {psm} --oem 3"
-            hocr_output = pytesseract.image_to_pdf_or_hocr(image, config=config, extension='hocr')
-            
-            # Save HOCR file
-            hocr_path = output_dir / f"{image_name}_psm{psm:02d}_hocr.html"
-            with open(hocr_path, 'wb') as f:
-                f.write(hocr_output)
+            data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DATAFRAME,
+                                             pandas_config={'dtype': {'text': str}})
             
             # Create visual overlay
             visual_path = output_dir / f"{image_name}_psm{psm:02d}_visual.png"
-            word_count, extracted_text = create_visual_overlay(image_path, hocr_path, visual_path, psm)
+            word_count, extracted_text = create_visual_overlay(image_path, data, visual_path, psm)
             
             # Also get plain text for comparison
             plain_text = pytesseract.image_to_string(image, config=config).strip()
@@ -84,7 +79,6 @@ def test_psm_with_visual_overlay(image_path: str, use_case: str = "both"):
                 'text': extracted_text,
                 'plain_text': plain_text,
                 'visual_path': visual_path,
-                'hocr_path': hocr_path,
                 # Check for key magazine terms
                 'has_private': 'PRIVATE' in extracted_text.upper(),
                 'has_eye': 'EYE' in extracted_text.upper(),
@@ -113,7 +107,7 @@ def test_psm_with_visual_overlay(image_path: str, use_case: str = "both"):
     return results
 
 
-def create_visual_overlay(image_path: str, hocr_path: Path, visual_path: Path, psm: int):
+def create_visual_overlay(image_path: str, data, visual_path: Path, psm: int):
     """Create visual debugging image with bounding boxes and text overlays."""
     
     try:
@@ -133,36 +127,20 @@ def create_visual_overlay(image_path: str, hocr_path: Path, visual_path: Path, p
                 font = None
                 small_font = None
         
-        # Parse HOCR file
-        with open(hocr_path, 'r', encoding='utf-8') as f:
-            hocr_content = f.read()
-        
-        soup = BeautifulSoup(hocr_content, 'html.parser')
-        
         words = []
         word_count = 0
         
-        # Extract words with bounding boxes
-        for span in soup.find_all('span', class_='ocrx_word'):
-            if 'title' in span.attrs:
-                title = span['title']
-                # Extract bounding box coordinates
-                bbox_part = [part for part in title.split(';') if 'bbox' in part]
-                if bbox_part:
-                    coords = list(map(int, bbox_part[0].split()[1:5]))
-                    text = span.get_text().strip()
-                    
-                    # Extract confidence if available
-                    conf_part = [part for part in title.split(';') if 'x_wconf' in part]
-                    confidence = int(conf_part[0].split()[-1]) if conf_part else 0
-                    
-                    if text and len(text) > 0:
-                        words.append({
-                            'text': text,
-                            'bbox': coords,
-                            'confidence': confidence
-                        })
-                        word_count += 1
+        # Extract words with bounding boxes; level 5 rows are words, the rest are
+        # pages, blocks, paragraphs and lines
+        for row in data[data['level'] == 5].dropna(subset=['text']).itertuples():
+            text = row.text.strip()
+            if text and len(text) > 0:
+                words.append({
+                    'text': text,
+                    'bbox': [row.left, row.top, row.left + row.width, row.top + row.height],
+                    'confidence': int(row.conf)
+                })
+                word_count += 1
         
         # Draw bounding boxes and text
         for word in words:
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of OCR and vision results, keyed by image content and model/config.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+from pathlib import Path
+
+CACHE_DIR = Path(".ocr_cache")
+
+
+def file_sha256(path):
+    """SHA-256 of a file's contents, hashed straight from a memory map.
+
+    Nothing is copied into Python buffers, and the pages stay in the OS cache
+    for whichever reader (usually Tesseract) opens the file next.
+    """
+    with open(path, "rb") as f:
+        # Empty files can't be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def image_blake2b(image):
+    """Digest of a decoded PIL image's mode, size and pixels, for images never written to disk."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _cache_path(image_hash, key, suffix=".json"):
+    # Model IDs contain ':' and '.', which aren't safe in every filesystem; a digest
+    # keeps distinct keys apart and the name short whatever the key looks like
+    key_hash = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return CACHE_DIR / f"{image_hash}_{key_hash}{suffix}"
+
+
+def _write_atomically(path, data):
+    # Write then rename so a crash never leaves a half-written entry behind; the
+    # temporary name is unique, so threads saving the same entry don't collide
+    CACHE_DIR.mkdir(exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=path.stem, suffix=".tmp")
+    with open(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_cached_result(image_hash, key):
+    """Return the cached result for this image and model/config, or None."""
+    try:
+        with open(_cache_path(image_hash, key), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_cached_result(image_hash, key, result):
+    """Store a JSON-serialisable result for this image and model/config."""
+    _write_atomically(_cache_path(image_hash, key), json.dumps(result).encode("utf-8"))
+
+
+def load_cached_bytes(image_hash, key):
+    """Return the bytes cached for this image and key (e.g. a re-encoded copy), or None."""
+    try:
+        return _cache_path(image_hash, key, ".bin").read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def save_cached_bytes(image_hash, key, data):
+    """Store raw bytes, such as a re-encoded copy of the image, for this image and key."""
+    _write_atomically(_cache_path(image_hash, key, ".bin"), data)
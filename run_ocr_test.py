@@ -6,7 +6,6 @@ One-click OCR test script - tests your image with optimal PSM modes and opens re
 import pytesseract
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
-from bs4 import BeautifulSoup
 import webbrowser
 import sys
 
@@ -48,19 +47,15 @@ def main():
         try:
             print(f"\nTesting PSM {psm}: {description}")
             
-            # Run OCR with HOCR output
+            # Run OCR with word boxes as a table straight from Tesseract's TSV, no HOCR to parse
             image = Image.open(image_path)
             config = f"--psm {psm} --oem 3"
-            hocr_output = pytesseract.image_to_pdf_or_hocr(image, config=config, extension='hocr')
-            
-            # Save and parse HOCR
-            hocr_path = output_dir / f"{image_name}_psm{psm}.html"
-            with open(hocr_path, 'wb') as f:
-                f.write(hocr_output)
+            data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DATAFRAME,
+                                             pandas_config={'dtype': {'text': str}})
             
             # Create visual with bounding boxes
             visual_path = output_dir / f"{image_name}_psm{psm}_visual.png"
-            word_count, text = create_visual_overlay(image_path, hocr_path, visual_path, psm, description)
+            word_count, text = create_visual_overlay(image_path, data, visual_path, psm, description)
             
             # Score this result
             score = word_count * 2 + len(text)
@@ -100,7 +95,7 @@ def main():
         print("❌ No successful results")
 
 
-def create_visual_overlay(image_path: str, hocr_path: Path, visual_path: Path, psm: int, description: str):
+def create_visual_overlay(image_path: str, data, visual_path: Path, psm: int, description: str):
     """Create visual debugging image with bounding boxes."""
     
     image = Image.open(image_path)
@@ -112,32 +107,21 @@ def create_visual_overlay(image_path: str, hocr_path: Path, visual_path: Path, p
     except:
         font = ImageFont.load_default()
     
-    # Parse HOCR
-    with open(hocr_path, 'r', encoding='utf-8') as f:
-        hocr_content = f.read()
-    
-    soup = BeautifulSoup(hocr_content, 'html.parser')
     words = []
     
-    # Extract words and coordinates with confidence filtering
-    for span in soup.find_all('span', class_='ocrx_word'):
-        if 'title' in span.attrs:
-            title = span['title']
-            bbox_part = [part for part in title.split(';') if 'bbox' in part]
-            conf_part = [part for part in title.split(';') if 'x_wconf' in part]
-            
-            if bbox_part:
-                coords = list(map(int, bbox_part[0].split()[1:5]))
-                text = span.get_text().strip()
-                confidence = int(conf_part[0].split()[-1]) if conf_part else 0
-                
-                # Filter out low confidence and likely false positives
-                if (text and 
-                    confidence >= 70 and  # Minimum 70% confidence
-                    len(text) >= 2 and    # At least 2 characters
-                    not all(c in '!@#$%^&*()_+-=[]{}|\\:";\'<>?,./' for c in text) and  # Not all symbols
-                    any(c.isalnum() for c in text)):  # Contains at least one letter/number
-                    words.append({'text': text, 'bbox': coords, 'confidence': confidence})
+    # Extract words and coordinates with confidence filtering; level 5 rows are words
+    for row in data[data['level'] == 5].dropna(subset=['text']).itertuples():
+        coords = [row.left, row.top, row.left + row.width, row.top + row.height]
+        text = row.text.strip()
+        confidence = int(row.conf)
+        
+        # Filter out low confidence and likely false positives
+        if (text and 
+            confidence >= 70 and  # Minimum 70% confidence
+            len(text) >= 2 and    # At least 2 characters
+            not all(c in '!@#$%^&*()_+-=[]{}|\\:";\'<>?,./' for c in text) and  # Not all symbols
+            any(c.isalnum() for c in text)):  # Contains at least one letter/number
+            words.append({'text': text, 'bbox': coords, 'confidence': confidence})
     
     # Draw bounding boxes and text with confidence-based colors
     for word in words:
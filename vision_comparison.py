@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the Claude vision test scripts: the Tesseract passes they
+compare against and retry handling for throttled API calls.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tenacity import wait_exponential
+
+from result_cache import load_cached_result, save_cached_result
+
+# Each tesseract process spawns up to 4 OpenMP threads by default; pin it to one
+# so the PSM passes we run side by side don't oversubscribe the CPU
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Longest single wait between retries of a throttled request, in seconds
+MAX_RETRY_WAIT = 32
+
+exponential_backoff = wait_exponential(multiplier=1, min=1, max=MAX_RETRY_WAIT)
+
+
+def wait_for_retry_after(retry_state):
+    """Wait as long as the API's Retry-After header asks, else back off exponentially."""
+    response = getattr(retry_state.outcome.exception(), 'response', None)
+    if isinstance(response, dict):
+        # botocore errors carry the parsed response, headers included
+        retry_after = response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('retry-after')
+    else:
+        retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), MAX_RETRY_WAIT)
+    except (TypeError, ValueError):
+        return exponential_backoff(retry_state)
+
+
+def report_retry(retry_state):
+    """Let the user know a transient failure is being retried.
+    
+    The notice goes to the retried call's file= argument when it has one, so it
+    lands in that call's buffered report rather than between other output.
+    """
+    error = retry_state.outcome.exception()
+    response = getattr(error, 'response', None)
+    reason = response['Error']['Code'] if isinstance(response, dict) else type(error).__name__
+    print(f"⏳ {reason}, retrying in {retry_state.next_action.sleep:.1f}s...", file=retry_state.kwargs.get('file'))
+
+
+def run_psm(image_path, name, psm):
+    """Run a single Tesseract pass, returning (name, text, error)."""
+    import pytesseract
+    
+    config = f"--psm {psm} --oem 3"
+    try:
+        return name, pytesseract.image_to_string(image_path, config=config).strip(), None
+    except Exception as e:
+        return name, "", e
+
+
+def binarize(image):
+    """Greyscale and Otsu-threshold the image, once, for every Tesseract pass to share."""
+    import cv2
+    import numpy as np
+    from PIL import Image
+    
+    gray = np.array(image.convert('L'))
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return Image.fromarray(binary)
+
+
+def recognise_psm_passes(image, configs):
+    """Run every (name, psm) pass over the image, returning (name, text, error) tuples."""
+    try:
+        # tesserocr keeps one Tesseract model resident across passes; optional
+        from tesserocr import PyTessBaseAPI, OEM
+    except ImportError:
+        PyTessBaseAPI = None
+    
+    if PyTessBaseAPI is not None:
+        # Load the model once and only switch page segmentation mode between passes.
+        # SetImage clears the previous recognition so each PSM is actually re-run.
+        results = []
+        with PyTessBaseAPI(oem=OEM.DEFAULT) as api:
+            for name, psm in configs:
+                try:
+                    api.SetImage(image)
+                    api.SetPageSegMode(psm)
+                    results.append((name, api.GetUTF8Text().strip(), None))
+                except Exception as e:
+                    results.append((name, "", e))
+        return results
+    
+    # Save the image once so every tesseract subprocess reads the same file,
+    # rather than pytesseract writing a temporary copy per pass.
+    # Each pass blocks on its own subprocess, so threads are enough
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_path = str(Path(tmp_dir) / "tesseract_input.png")
+        image.save(image_path)
+        with ThreadPoolExecutor(max_workers=len(configs)) as executor:
+            futures = [executor.submit(run_psm, image_path, name, psm) for name, psm in configs]
+            return [future.result() for future in futures]
+
+
+def run_psm_passes(image, image_hash, configs):
+    """Binarize the image and run every pass, reusing text cached for passes already run on this image."""
+    cached = {}
+    for name, psm in configs:
+        entry = load_cached_result(image_hash, f"tesseract-otsu-psm{psm}-oem3")
+        if entry is not None:
+            cached[name] = entry['text']
+    
+    pending = [(name, psm) for name, psm in configs if name not in cached]
+    fresh = {}
+    if pending:
+        for (name, text, error), (_, psm) in zip(recognise_psm_passes(binarize(image), pending), pending):
+            fresh[name] = (text, error)
+            if not error:
+                save_cached_result(image_hash, f"tesseract-otsu-psm{psm}-oem3", {'text': text})
+    
+    return [
+        (name, cached[name], None) if name in cached else (name, *fresh[name])
+        for name, _ in configs
+    ]
@@ -8,6 +8,8 @@ from pathlib import Path
 import pytesseract
 from PIL import Image
 
+from key_terms import KEY_TERMS, find_key_terms
+
 
 def encode_image_for_vision(image_path):
     """Encode image for vision model APIs."""
@@ -46,9 +48,9 @@ def test_tesseract_extraction(image_path):
         # Check for key terms
         combined_text = ' '.join([pytesseract.image_to_string(image, config=config) for _, config in configs])
         
-        key_terms = ['PRIVATE', 'EYE', 'ANDREW', 'DENIES', 'BEING', 'CHINESE', 'SPY', '1642']
-        found_terms = [term for term in key_terms if term in combined_text.upper()]
-        missing_terms = [term for term in key_terms if term not in combined_text.upper()]
+        key_terms = KEY_TERMS
+        found_terms = find_key_terms(combined_text)
+        missing_terms = [term for term in key_terms if term not in found_terms]
         
         print(f"\n✅ Found: {found_terms}")
         print(f"❌ Missing: {missing_terms}")
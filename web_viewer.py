@@ -24,15 +24,32 @@ def to_json_filter(obj):
 ocr_data = []
 image_dir = Path(".")
 
+# Earlier versions of ocr_extractor.py wrote every page as one JSON array
+LEGACY_OCR_FILE = Path("magazine_ocr.json")
 
-def load_ocr_data(json_file: Path = Path("magazine_ocr.json")):
-    """Load OCR data from JSON file."""
+
+def load_ocr_data(json_file: Path = Path("magazine_ocr.jsonl")):
+    """Load OCR data from JSON Lines file, one page per line."""
     global ocr_data
     try:
         with open(json_file, 'r', encoding='utf-8') as f:
-            ocr_data = json.load(f)
+            ocr_data = []
+            for line in f:
+                try:
+                    ocr_data.append(json.loads(line))
+                except ValueError:
+                    # Partial line from an interrupted extractor run
+                    continue
+        # Resumed runs append pages out of filename order
+        ocr_data.sort(key=lambda page: page['source'])
         print(f"Loaded OCR data for {len(ocr_data)} pages")
     except FileNotFoundError:
+        if LEGACY_OCR_FILE.exists():
+            with open(LEGACY_OCR_FILE, 'r', encoding='utf-8') as f:
+                ocr_data = json.load(f)
+            print(f"Loaded OCR data for {len(ocr_data)} pages from the old {LEGACY_OCR_FILE}; "
+                  f"rerun ocr_extractor.py to write {json_file}")
+            return
         print(f"OCR data file {json_file} not found. Run ocr_extractor.py first.")
         ocr_data = []
 